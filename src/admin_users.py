@@ -0,0 +1,36 @@
+"""Grant or withdraw access to the /admin routes.
+
+Access is an is_admin flag on the user document, so it follows the account
+rather than its username and cannot be claimed by registering a name.
+
+    python src/admin_users.py grant <username>
+    python src/admin_users.py revoke <username>
+    python src/admin_users.py list
+"""
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage access to the /admin routes")
+    parser.add_argument("action", choices=["grant", "revoke", "list"])
+    parser.add_argument("username", nargs="?")
+    args = parser.parse_args()
+    if args.action != "list" and not args.username:
+        parser.error(f"{args.action} needs a username")
+
+    from database import DatabaseHandler
+    db = DatabaseHandler(check_schema=False)
+    try:
+        if args.action == "list":
+            for username in db.get_admin_usernames():
+                print(username)
+        elif db.set_admin(args.username, args.action == "grant"):
+            print(f"{'Granted' if args.action == 'grant' else 'Revoked'} admin access for {args.username}")
+        else:
+            print(f"User {args.username} not found")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+from database import DatabaseHandler
+from executor import run_blocking
+
+
+class AsyncDatabaseHandler:
+    """Awaitable facade over DatabaseHandler for async routes.
+
+    pymongo is blocking, so each call runs on the bounded blocking pool
+    rather than on the event loop, which is also how Motor works under
+    the hood. Only the calls the routes make are wrapped; add others as
+    routes need them.
+    """
+
+    def __init__(self, db: DatabaseHandler):
+        self.sync = db
+
+    async def get_user_data(self, user_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        return await run_blocking(self.sync.get_user_data, user_id, fields)
+
+    async def get_chat_history_page(self, user_id: str, limit: int = 50,
+                                    cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        return await run_blocking(self.sync.get_chat_history_page, user_id, limit, cursor)
@@ -3,22 +3,26 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
-from database import DatabaseHandler
-import bcrypt
+import os
+import time
+from database import get_database
+from executor import run_blocking
+from principal_cache import PrincipalCache
+from password_hasher import hasher, PasswordHasherBusy
+import metrics
 
 # Security configuration
 SECRET_KEY = "your-secret-key-here"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Build the principal from the token's claims instead of loading the user;
+# revocations still apply, other profile changes show up on the next login
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv('AUTH_TRUST_TOKEN_CLAIMS', 'false').lower() == 'true'
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-db = DatabaseHandler()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+db = get_database()
+# Authenticated users per token, so most requests skip the users lookup
+principals = PrincipalCache(revocation_ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -26,7 +30,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # A fractional iat, compared against the equally precise tokens_valid_after revocation cutoff
+    to_encode.update({"exp": expire, "iat": time.time()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -37,16 +42,44 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with metrics.stage("jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = db.get_user_by_username(username)
+
+    with metrics.stage("principal_lookup"):
+        return await _load_principal(username, payload, credentials_exception)
+
+async def _load_principal(username: str, payload: dict, credentials_exception: HTTPException):
+    """The user a decoded token stands for, from its claims, the principal cache or MongoDB"""
+    if principals.poll_due():
+        await run_blocking(principals.refresh, db.get_token_revocations)
+    issued_at = payload.get("iat")
+    if principals.is_revoked(username, issued_at):
+        raise credentials_exception
+
+    if AUTH_TRUST_TOKEN_CLAIMS and "uid" in payload:
+        return {
+            "_id": payload["uid"],
+            "username": username,
+            "email": payload.get("email"),
+            "is_active": payload.get("active", True)
+        }
+
+    user = principals.get(username, payload.get("exp"))
+    if user is not None:
+        return user
+
+    user = await run_blocking(db.get_user_by_username, username)
     if user is None:
         raise credentials_exception
+    valid_after = user.pop("tokens_valid_after", None)
+    if valid_after is not None and (issued_at is None or issued_at < valid_after):
+        raise credentials_exception
+    principals.set(username, payload.get("exp"), user)
     return user
 
 async def get_current_active_user(current_user = Depends(get_current_user)):
@@ -54,33 +87,57 @@ async def get_current_active_user(current_user = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def register_user(username: str, email: str, password: str) -> tuple[bool, str]:
+async def get_current_admin_user(current_user = Depends(get_current_active_user)):
+    # Read from the user document on every call rather than trusting a name or a cached principal
+    if not await run_blocking(db.is_admin, current_user["_id"]):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+async def register_user(username: str, email: str, password: str) -> tuple[bool, str]:
     """Register a new user"""
     try:
         # Create user with initial data
-        success = db.create_user(username, email, password)
+        password_hash = await hasher.hash_async(password)
+        success = await run_blocking(db.insert_user, username, email, password_hash)
         if success:
             return True, "User registered successfully"
         return False, "Username or email already exists"
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         print(f"Registration error: {str(e)}")
         return False, f"Error registering user: {str(e)}"
 
-def login_user(username: str, password: str) -> tuple[bool, str, dict]:
+async def login_user(username: str, password: str) -> tuple[bool, str, dict]:
     """Login user and return token"""
     try:
-        success, message, user = db.verify_user(username, password)
-        if not success:
-            return False, message, None
+        user = await run_blocking(db.get_user_credentials, username)
+        if not user:
+            return False, "User not found", None
+        if not await hasher.verify_async(password, user["password"]):
+            return False, "Incorrect password", None
+        if not user.get("is_active", True):
+            return False, "Account is deactivated", None
+
+        # Upgrade the stored hash when BCRYPT_ROUNDS changed, in the last_login write
+        rehashed = await hasher.hash_async(password) if hasher.needs_rehash(user["password"]) else None
+        await run_blocking(db.record_login, user["_id"], rehashed)
+        user = db.public_user(user)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": username}, expires_delta=access_token_expires
+            data={
+                "sub": username,
+                "uid": user["_id"],
+                "email": user.get("email"),
+                "active": user.get("is_active", True)
+            },
+            expires_delta=access_token_expires
         )
         
         # Get user's telecom data
-        user_data = db.get_user_data(user["_id"])
+        user_data = await run_blocking(db.get_user_data, user["_id"])
         
         return True, "Login successful", {
             "access_token": access_token,
@@ -88,6 +145,8 @@ def login_user(username: str, password: str) -> tuple[bool, str, dict]:
             "user": user,
             "user_data": user_data
         }
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         print(f"Login error: {str(e)}")
         return False, f"Error during login: {str(e)}", None
@@ -134,6 +193,11 @@ def update_user_profile(username: str, update_data: dict) -> tuple[bool, str]:
             success, message = db.update_user(username, auth_data)
             if not success:
                 return False, message
+            if auth_data.get("username", username) != username:
+                # Tokens name the old username, so they have to go
+                revoke_tokens(username)
+            else:
+                principals.invalidate(username)
         
         # Update telecom data if present
         if telecom_data:
@@ -145,10 +209,39 @@ def update_user_profile(username: str, update_data: dict) -> tuple[bool, str]:
     except Exception as e:
         return False, f"Error updating profile: {str(e)}"
 
-def change_password(username: str, current_password: str, new_password: str) -> tuple[bool, str]:
+async def change_password(username: str, current_password: str, new_password: str) -> tuple[bool, str]:
     """Change user password"""
     try:
-        success, message = db.change_password(username, current_password, new_password)
-        return success, message
+        user = await run_blocking(db.get_user_credentials, username)
+        if not user:
+            return False, "User not found"
+        if not await hasher.verify_async(current_password, user["password"]):
+            return False, "Current password is incorrect"
+
+        password_hash = await hasher.hash_async(new_password)
+        if not await run_blocking(db.set_password_hash, username, password_hash):
+            return False, "Failed to update password"
+        await run_blocking(revoke_tokens, username)
+        return True, "Password updated successfully"
+    except PasswordHasherBusy:
+        raise
+    except Exception as e:
+        return False, f"Error changing password: {str(e)}"
+
+def deactivate_user(username: str) -> tuple[bool, str]:
+    """Deactivate a user and reject the tokens they already hold.
+
+    Deactivating an inactive user succeeds and revokes their tokens again,
+    so retrying is always safe.
+    """
+    try:
+        if not db.deactivate_user(username):
+            return False, "User not found"
+        revoke_tokens(username)
+        return True, "User deactivated"
     except Exception as e:
-        return False, f"Error changing password: {str(e)}" 
\ No newline at end of file
+        return False, f"Error deactivating user: {str(e)}"
+
+def revoke_tokens(username: str):
+    """Reject every token issued to username so far, in this worker and, once they poll, in the others"""
+    principals.revoke(username, db.revoke_tokens(username)) 
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""Requests/sec of the /chat path against a slow stand-in for the OpenAI API.
+
+Every message misses the keyword path so each request waits on the LLM.
+The blocking run calls get_response on the event loop the way /chat used
+to; the async run awaits get_response_async with the same concurrency.
+
+Usage: python src/benchmarks/async_chat.py --requests 200 --concurrency 100 --llm-delay 0.5
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from chatbot import TelecomChatbot
+
+LLM_REPLY = json.dumps({"intent": "general_query", "entities": {}, "urgency": "low"})
+
+
+def _completion():
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=LLM_REPLY))])
+
+
+class SlowCompletions:
+    """Synchronous chat.completions stand-in that sleeps for a fixed delay"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def create(self, **kwargs):
+        time.sleep(self.delay)
+        return _completion()
+
+
+class AsyncSlowCompletions(SlowCompletions):
+    """Async chat.completions stand-in that sleeps for a fixed delay"""
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        return _completion()
+
+
+async def _drive(handler, requests: int, concurrency: int) -> float:
+    """Send requests through handler with bounded concurrency, returning requests/sec"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await handler(f"qzx zzq {i}", {"user_id": f"bench-{i}"}, f"bench-{i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+def run_benchmark(requests: int, concurrency: int, llm_delay: float):
+    chatbot = TelecomChatbot()
+    chatbot.client = SimpleNamespace(chat=SimpleNamespace(completions=SlowCompletions(llm_delay)))
+    chatbot.async_client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncSlowCompletions(llm_delay)))
+
+    async def blocking(message, user_data, session_id):
+        return chatbot.get_response(message, user_data, session_id)
+
+    # The blocking path serialises on the event loop, so keep its run short
+    blocking_requests = max(1, min(requests, int(5 / llm_delay) if llm_delay else requests))
+    blocking_rps = asyncio.run(_drive(blocking, blocking_requests, concurrency))
+    async_rps = asyncio.run(_drive(chatbot.get_response_async, requests, concurrency))
+
+    print(f"LLM delay {llm_delay * 1000:.0f} ms, concurrency {concurrency}")
+    print(f"- blocking get_response:  {blocking_rps:8.1f} req/s ({blocking_requests} requests)")
+    print(f"- get_response_async:     {async_rps:8.1f} req/s ({requests} requests)")
+    chatbot.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="seconds per LLM call")
+    args = parser.parse_args()
+    run_benchmark(args.requests, args.concurrency, args.llm_delay)
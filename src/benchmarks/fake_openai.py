@@ -0,0 +1,141 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Answers POST /v1/chat/completions with a plausible intent analysis after a
+configurable latency, and fails a configurable fraction of requests with
+500 or 429, so load tests exercise the timeout, retry and circuit breaker
+paths without calling OpenAI. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage: python src/benchmarks/fake_openai.py --port 8081 --latency-ms 400 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+INTENT_WORDS = {
+    "payment": ("pay", "payment", "card", "autopay"),
+    "billing": ("bill", "invoice", "charge", "statement"),
+    "technical_support": ("slow", "signal", "internet", "wifi", "router", "outage", "dropping", "connect"),
+    "account_info": ("account", "profile", "address", "email"),
+    "plan_info": ("plan", "upgrade", "unlimited", "roaming", "contract"),
+}
+BATCH_LINE = re.compile(r'^\s*\d+\. (".*")\s*$', re.MULTILINE)
+
+
+def classify(message: str) -> dict:
+    """Keyword-rule intent analysis in the shape the chatbot asks OpenAI for"""
+    text = message.lower()
+    intent = next((name for name, words in INTENT_WORDS.items() if any(w in text for w in words)), "general_query")
+    urgency = "high" if any(w in text for w in ("urgent", "now", "asap", "down")) else "low"
+    return {"intent": intent, "entities": {}, "urgency": urgency}
+
+
+def completion_content(messages: list) -> str:
+    """Content of the assistant reply for a chat.completions request"""
+    prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    if '"results" array' in prompt:
+        batch = [json.loads(line) for line in BATCH_LINE.findall(prompt)]
+        return json.dumps({"results": [classify(message) for message in batch]})
+    match = re.search(r"Message: (.*)", prompt)
+    return json.dumps(classify(match.group(1) if match else prompt))
+
+
+class FakeOpenAI:
+    """Threaded HTTP server speaking just enough of the OpenAI API for the chatbot"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 400,
+                 jitter: float = 0.25, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                status, payload = fake.respond(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def respond(self, path: str, body: dict):
+        with self._lock:
+            self.requests += 1
+            delay = self.latency * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+
+        if not path.rstrip("/").endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}
+        if failed:
+            status = self.random.choice((429, 500))
+            return status, {"error": {"message": "Simulated failure", "type": "server_error"}}
+        return 200, {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-3.5-turbo"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": completion_content(body.get("messages", []))},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "errors": self.errors}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency varies by +/- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOpenAI(args.host, args.port, args.latency_ms, args.jitter, args.error_rate)
+    print(f"Fake OpenAI listening on {fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,273 @@
+"""Load test of one main.py worker: throughput and p50/p95/p99 per resolution path.
+
+Starts the fake OpenAI server (fake_openai.py) and the app under uvicorn in
+this process, backed by an in-memory MongoDB stand-in (mongomock) or a real
+one; `pip install -r requirements-dev.txt` installs both clients. Virtual
+users register, log in through /token and then replay a mix of greetings,
+menu digits, keywords, typos and free text through /chat.
+
+Latencies are grouped by the path that actually served each request, as the
+worker reports it in the X-Resolution-Path header: menu, exact, phonetic
+and fuzzy keyword matches, llm_cache, llm_coalesced (waited for an identical
+in-flight request), llm, fallback and error. A table per traffic class
+follows. Workers started separately need RESOLUTION_PATH_HEADER=true.
+
+The client shares a process with the server here, so absolute numbers are
+pessimistic; use them to compare runs. For cleaner numbers, start a worker
+with OPENAI_BASE_URL pointing at a separately started fake_openai.py and
+pass --target.
+
+Usage: python src/benchmarks/load_test.py --users 50 --duration 30 --llm-latency-ms 400
+       python src/benchmarks/load_test.py --target http://127.0.0.1:8000 --users 100
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import httpx
+from fake_openai import FakeOpenAI
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Traffic class -> (weight, sample messages)
+TRAFFIC_MIX = {
+    "greeting": (0.15, ["hi", "hello", "hey there", "good morning"]),
+    "menu": (0.40, ["1", "2", "3", "4", "5", "back"]),
+    "keyword": (0.15, ["pay my bill", "check my data usage", "change plan", "my account", "invoice"]),
+    "typo": (0.15, ["paymnt", "my acount", "biling", "suport", "usge", "upgrde", "notifcation"]),
+    "free_text": (0.15, [
+        f"{opening} {subject}" for opening in ("why is", "can you help, my", "I am annoyed that my", "what happens if my")
+        for subject in ("phone so slow at night", "wifi keeps dropping", "card got declined", "roaming abroad",
+                        "contract ends next month", "router light is red", "address changed")
+    ]),
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(samples: Dict[str, List[float]], errors: Dict[str, int]) -> Dict[str, dict]:
+    groups = {}
+    for name in sorted(set(samples) | set(errors)):
+        latencies = sorted(samples.get(name, []))
+        groups[name] = {
+            "count": len(latencies),
+            "errors": errors.get(name, 0),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+        }
+    return groups
+
+
+class Recorder:
+    """Latency samples per resolution path and per traffic class, ignoring those taken during warm-up"""
+
+    def __init__(self, warmup_until: float):
+        self.warmup_until = warmup_until
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.path_samples: Dict[str, List[float]] = defaultdict(list)
+        self.path_errors: Dict[str, int] = defaultdict(int)
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def record(self, name: str, started: float, ok: bool, in_window: bool = True, path: Optional[str] = None):
+        """Store one sample; in_window=False keeps it out of warm-up filtering and throughput"""
+        finished = time.perf_counter()
+        if in_window:
+            if started < self.warmup_until:
+                return
+            self.first = started if self.first is None else min(self.first, started)
+            self.last = finished if self.last is None else max(self.last, finished)
+        if ok:
+            self.samples[name].append(finished - started)
+            if path:
+                self.path_samples[path].append(finished - started)
+        else:
+            self.errors[name] += 1
+            if path:
+                self.path_errors[path] += 1
+
+    def report(self) -> dict:
+        elapsed = (self.last - self.first) if self.first is not None else 0.0
+        classes = summarize(self.samples, self.errors)
+        chat = [c for name, c in classes.items() if name != "login"]
+        total = sum(c["count"] for c in chat)
+        return {
+            "elapsed_s": elapsed,
+            "requests": total,
+            "errors": sum(c["errors"] for c in chat),
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "paths": summarize(self.path_samples, self.path_errors),
+            "classes": classes,
+        }
+
+
+async def virtual_user(client: httpx.AsyncClient, index: int, run_id: str, deadline: float,
+                       recorder: Recorder, rng: random.Random, think: float, unique_free_text: bool):
+    username = f"load-{run_id}-{index}"
+    password = "load-test-password"
+    await client.post("/register", data={"username": username, "password": password})
+    started = time.perf_counter()
+    response = await client.post("/token", data={"username": username, "password": password})
+    # Every user logs in during warm-up, so logins are reported but not part of the throughput
+    recorder.record("login", started, response.status_code == 200, in_window=False)
+    if response.status_code != 200:
+        return
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    names = list(TRAFFIC_MIX)
+    weights = [TRAFFIC_MIX[name][0] for name in names]
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        message = rng.choice(TRAFFIC_MIX[name][1])
+        if unique_free_text and name == "free_text":
+            # Defeat the intent caches so every free-text message reaches the LLM stand-in
+            message = f"{message} (ref {rng.randrange(10 ** 9)})"
+        started = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"message": message}, headers=headers)
+            ok = response.status_code == 200
+            # Workers started without RESOLUTION_PATH_HEADER=true do not say
+            path = response.headers.get("x-resolution-path", "unknown")
+        except httpx.HTTPError:
+            ok = False
+            path = "transport_error"
+        recorder.record(name, started, ok, path=path)
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+
+
+async def drive(base_url: str, users: int, duration: float, warmup: float, think: float, seed: int,
+                unique_free_text: bool = False) -> Tuple[dict, dict]:
+    start = time.perf_counter()
+    recorder = Recorder(start + warmup)
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(
+            virtual_user(client, i, run_id, start + warmup + duration, recorder, random.Random(seed + i), think,
+                         unique_free_text)
+            for i in range(users)
+        ))
+        health = (await client.get("/health")).json()
+    return recorder.report(), health
+
+
+def use_memory_mongo():
+    """Back DatabaseHandler with one shared, migrated mongomock client seeded by setup_all"""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("--mongo memory needs mongomock: pip install mongomock")
+    import database
+    client = mongomock.MongoClient()
+    database.MongoClient = lambda *args, **kwargs: client
+    import migrations
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrations.migrate(database.DatabaseHandler(check_schema=False))
+    sys.path.append(os.path.join(ROOT, "src", "setup_data"))
+    import setup_all
+    with contextlib.redirect_stdout(io.StringIO()):
+        setup_all.setup_all()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(port: int):
+    """Run main.app under uvicorn on a background thread"""
+    import uvicorn
+    os.chdir(ROOT)
+    os.environ.setdefault("RESOLUTION_PATH_HEADER", "true")
+    import main
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("The app failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def print_report(report: dict, health: dict, fake: Optional[FakeOpenAI]):
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f} s: "
+          f"{report['throughput_rps']:.1f} req/s, {report['errors']} errors")
+    for title, groups in (("path", report["paths"]), ("class", report["classes"])):
+        print(f"\n{title:<15} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, c in groups.items():
+            print(f"{name:<15} {c['count']:>7} {c['errors']:>7} {c['p50_ms']:>9.1f} {c['p95_ms']:>9.1f} {c['p99_ms']:>9.1f}")
+    if fake:
+        print(f"\nFake OpenAI: {fake.stats()}")
+    print(f"LLM breaker: {health.get('llm_breaker')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds excluded from the report")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's messages")
+    parser.add_argument("--target", help="base URL of an already running worker")
+    parser.add_argument("--mongo", choices=("memory", "uri"), default="memory",
+                        help="mongomock, or the server at MONGODB_URI (seed it with setup_data first)")
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--unique-free-text", action="store_true",
+                        help="make every free-text message unique so it misses the intent caches")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    fake = server = thread = None
+    base_url = args.target
+    if not base_url:
+        fake = FakeOpenAI(latency_ms=args.llm_latency_ms, error_rate=args.llm_error_rate, seed=args.seed).start()
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "load-test")
+        if args.mongo == "memory":
+            use_memory_mongo()
+        port = free_port()
+        server, thread = start_app(port)
+        base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        report, health = asyncio.run(drive(base_url, args.users, args.duration, args.warmup,
+                                           args.think_ms / 1000, args.seed, args.unique_free_text))
+    finally:
+        if server:
+            server.should_exit = True
+            thread.join()
+        if fake:
+            fake.stop()
+
+    print_report(report, health, fake)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
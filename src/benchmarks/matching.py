@@ -0,0 +1,226 @@
+"""Microbenchmarks of the intent-matching hot path.
+
+Times TelecomChatbot.analyze_intent (with OpenAI stubbed out),
+DatabaseHandler.get_intent_by_keyword, DatabaseHandler.get_fuzzy_suggestions
+and RulesHandler.find_matching_rule over a generated vocabulary of
+100 to 50k keywords and messages of 1 to 16 words. Messages mix exact
+keywords, typos of keywords and unknown words. Each case reports ns/op and
+the peak memory allocated while running it, and is compared with the
+stored baseline so a scaling regression shows up as a ratio.
+
+Baselines are only comparable on the machine that recorded them; refresh
+with --save-baseline after an intended change.
+
+Usage: python src/benchmarks/matching.py                      # compare with matching_baseline.json
+       python src/benchmarks/matching.py --vocab 100,1000 --words 1,4
+       python src/benchmarks/matching.py --save-baseline
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import contextlib
+import json
+import platform
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+from chatbot import TelecomChatbot
+from database import DatabaseHandler
+from keyword_index import KeywordMatcher
+from rules import RulesHandler
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "matching_baseline.json")
+INTENTS = ["payment", "billing", "technical_support", "account_info", "plan_info",
+           "view_usage", "setup_alerts", "change_data_plan"]
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ka", "le", "mi", "no", "pu", "ra", "se", "ti", "vo", "za",
+             "bel", "con", "dat", "net", "pay", "plan", "serv", "tel", "ing", "ment", "tion"]
+POOL_SIZE = 256
+
+
+def generate_vocabulary(size: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """size unique (keyword, intent) pairs, a fifth of them two-word phrases"""
+    pairs = {}
+    while len(pairs) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.2:
+            word += " " + "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+        pairs.setdefault(word, rng.choice(INTENTS))
+    return list(pairs.items())
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """Drop, swap or duplicate one character"""
+    if len(word) < 3:
+        return word + word[-1]
+    i = rng.randrange(len(word) - 1)
+    edit = rng.randrange(3)
+    if edit == 0:
+        return word[:i] + word[i + 1:]
+    if edit == 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + word[i] + word[i:]
+
+
+def generate_messages(vocabulary: List[Tuple[str, str]], words: int, rng: random.Random) -> List[str]:
+    """POOL_SIZE messages of `words` words: 30% keywords, 30% typos, 40% unknown words"""
+    vocab_words = [w for keyword, _ in vocabulary for w in keyword.split()]
+    messages = []
+    for _ in range(POOL_SIZE):
+        parts = []
+        for _ in range(words):
+            roll = rng.random()
+            if roll < 0.3:
+                parts.append(rng.choice(vocab_words))
+            elif roll < 0.6:
+                parts.append(typo(rng.choice(vocab_words), rng))
+            else:
+                parts.append("".join(rng.choice("qxjzwvyk") for _ in range(rng.randint(3, 8))))
+        messages.append(" ".join(parts))
+    return messages
+
+
+def keyword_handler(vocabulary: List[Tuple[str, str]]) -> DatabaseHandler:
+    """DatabaseHandler holding only the in-memory matcher the keyword lookups use"""
+    handler = DatabaseHandler.__new__(DatabaseHandler)
+    handler.keyword_cache = vocabulary
+    handler.keyword_matcher = KeywordMatcher(vocabulary)
+    return handler
+
+
+def offline_chatbot(handler: DatabaseHandler) -> TelecomChatbot:
+    """TelecomChatbot over handler whose OpenAI fallback returns at once"""
+    chatbot = TelecomChatbot(db=handler)
+    chatbot._analyze_with_openai = lambda message: chatbot._fallback_intent()
+    return chatbot
+
+
+def rules_handler(vocabulary: List[Tuple[str, str]]) -> RulesHandler:
+    """RulesHandler whose rules hold the generated keywords, grouped by intent"""
+    handler = RulesHandler()
+    handler.rules = {}
+    for keyword, intent in vocabulary:
+        handler.rules.setdefault(intent, {"keywords": [], "responses": [intent]})["keywords"].append(keyword)
+    return handler
+
+
+def time_case(op: Callable[[str], object], messages: List[str], min_time: float, repeat: int,
+              reset: Callable[[], None]) -> float:
+    """Best ns/op over `repeat` runs of at least min_time seconds, after one warm-up pass.
+
+    The fuzzy memo is cleared before every pass, so each one starts cold.
+    """
+    for message in messages:
+        op(message)
+    best = float("inf")
+    for _ in range(repeat):
+        elapsed = 0
+        ops = 0
+        while elapsed < min_time * 1e9:
+            reset()
+            start = time.perf_counter_ns()
+            for message in messages:
+                op(message)
+            elapsed += time.perf_counter_ns() - start
+            ops += len(messages)
+        best = min(best, elapsed / ops)
+    return best
+
+
+def allocated_case(op: Callable[[str], object], messages: List[str], reset: Callable[[], None]) -> int:
+    """Peak bytes allocated while running op once over the message pool"""
+    reset()
+    tracemalloc.start()
+    try:
+        for message in messages:
+            op(message)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(vocab_sizes: List[int], word_counts: List[int], min_time: float, repeat: int, seed: int) -> Dict[str, dict]:
+    results = {}
+    devnull = open(os.devnull, "w")
+    for size in vocab_sizes:
+        rng = random.Random(seed + size)
+        vocabulary = generate_vocabulary(size, rng)
+        handler = keyword_handler(vocabulary)
+        chatbot = offline_chatbot(handler)
+        rules = rules_handler(vocabulary)
+        # Fuzzy results for repeated words are memoised; clear them before every pass
+        reset = handler.keyword_matcher._best_fuzzy.cache_clear
+
+        cases = {
+            "analyze_intent": chatbot.analyze_intent,
+            "get_intent_by_keyword": lambda message: handler.get_intent_by_keyword(message.lower()),
+            "get_fuzzy_suggestions": handler.get_fuzzy_suggestions,
+            "find_matching_rule": rules.find_matching_rule,
+        }
+        for words in word_counts:
+            messages = generate_messages(vocabulary, words, rng)
+            for name, op in cases.items():
+                key = f"{name}/vocab={size}/words={words}"
+                with contextlib.redirect_stdout(devnull):
+                    ns = time_case(op, messages, min_time, repeat, reset)
+                    peak = allocated_case(op, messages, reset)
+                results[key] = {"ns_per_op": ns, "peak_alloc_bytes": peak}
+                print(f"{key:<50} {ns:>14,.0f} ns/op {peak / 1024:>10,.1f} KiB peak", flush=True)
+    devnull.close()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Print ratios to the baseline and return the cases slower than threshold"""
+    regressions = []
+    print(f"\n{'case':<50} {'baseline':>14} {'now':>14} {'ratio':>7}")
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["ns_per_op"] / baseline[key]["ns_per_op"]
+        flag = "  <-- slower" if ratio > threshold else ""
+        print(f"{key:<50} {baseline[key]['ns_per_op']:>14,.0f} {result['ns_per_op']:>14,.0f} {ratio:>7.2f}{flag}")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab", default="100,1000,10000,50000", help="comma-separated vocabulary sizes")
+    parser.add_argument("--words", default="1,4,16", help="comma-separated message lengths in words")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the best is kept")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=1.5, help="ratio to the baseline counted as a regression")
+    args = parser.parse_args()
+
+    results = run([int(v) for v in args.vocab.split(",")], [int(w) for w in args.words.split(",")],
+                  args.min_time, args.repeat, args.seed)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "results": results},
+                      f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) more than {args.threshold}x slower than the baseline")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
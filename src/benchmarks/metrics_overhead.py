@@ -0,0 +1,143 @@
+"""Overhead of the per-stage latency instrumentation in metrics.py.
+
+Times the primitives a chat request pays for: metrics.stage() with and
+without a request being timed, set_path(), and a whole timed request of
+ten stages including the histogram updates. It then runs
+TelecomChatbot.analyze_intent (OpenAI stubbed out) over the generated
+vocabulary from matching.py with and without a timed request around
+each call, and reports the difference. /metrics rendering is timed at
+the number of series a busy worker reaches.
+
+Usage: python src/benchmarks/metrics_overhead.py
+       python src/benchmarks/metrics_overhead.py --vocab 10000 --words 4
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import argparse
+import contextlib
+import random
+import time
+from typing import Callable
+
+import metrics
+from matching import generate_messages, generate_vocabulary, keyword_handler, offline_chatbot
+
+STAGES = ("jwt_decode", "principal_lookup", "user_data", "session_load", "keyword_lookup",
+          "intent_match", "rule_response", "session_save", "history_submit", "llm")
+
+
+def ns_per_call(func: Callable[[], object], min_time: float, repeat: int, batch: int = 1000) -> float:
+    """Best ns per call over `repeat` runs of at least min_time seconds, checking the clock every batch calls"""
+    best = float("inf")
+    for _ in range(repeat):
+        calls = 0
+        start = time.perf_counter_ns()
+        deadline = start + min_time * 1e9
+        while True:
+            for _ in range(batch):
+                func()
+            calls += batch
+            now = time.perf_counter_ns()
+            if now >= deadline:
+                break
+        best = min(best, (now - start) / calls)
+    return best
+
+
+def empty_stage():
+    with metrics.stage("keyword_lookup"):
+        pass
+
+
+def timed_stage():
+    with metrics.timed_request("/bench"):
+        with metrics.stage("keyword_lookup"):
+            pass
+
+
+def timed_request():
+    with metrics.timed_request("/chat"):
+        for name in STAGES:
+            with metrics.stage(name):
+                pass
+        metrics.set_path("exact")
+
+
+def untimed_request():
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab", type=int, default=1000, help="vocabulary size for the analyze_intent run")
+    parser.add_argument("--words", type=int, default=4, help="message length in words")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case; the best is kept")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if not metrics.METRICS_ENABLED:
+        raise SystemExit("METRICS_ENABLED is false; unset it to measure the instrumentation")
+
+    print(f"{'case':<44} {'ns/call':>12}")
+    baseline = ns_per_call(untimed_request, args.min_time, args.repeat)
+    cases = [
+        ("stage() with no request timed", empty_stage),
+        ("set_path() with no request timed", lambda: metrics.set_path("exact")),
+        ("timed request with one stage", timed_stage),
+        (f"timed request with {len(STAGES)} stages", timed_request),
+    ]
+    for name, func in cases:
+        print(f"{name:<44} {ns_per_call(func, args.min_time, args.repeat) - baseline:>12,.0f}")
+
+    # analyze_intent is the cheapest resolution path with real work; the rest only add latency
+    rng = random.Random(args.seed)
+    vocabulary = generate_vocabulary(args.vocab, rng)
+    handler = keyword_handler(vocabulary)
+    chatbot = offline_chatbot(handler)
+    messages = generate_messages(vocabulary, args.words, rng)
+    reset = handler.keyword_matcher._best_fuzzy.cache_clear
+
+    def plain():
+        for message in messages:
+            chatbot.analyze_intent(message)
+
+    def instrumented():
+        for message in messages:
+            with metrics.timed_request("/bench"):
+                with metrics.stage("intent_match"):
+                    chatbot.analyze_intent(message)
+
+    def run(func):
+        def call():
+            reset()
+            func()
+        return call
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        run(plain)()
+        plain_ns = ns_per_call(run(plain), args.min_time, args.repeat, batch=1) / len(messages)
+        instrumented_ns = ns_per_call(run(instrumented), args.min_time, args.repeat, batch=1) / len(messages)
+    overhead = instrumented_ns - plain_ns
+    print(f"\nanalyze_intent, vocab={args.vocab}, words={args.words}")
+    print(f"{'  uninstrumented':<44} {plain_ns:>12,.0f}")
+    print(f"{'  timed request around each call':<44} {instrumented_ns:>12,.0f}")
+    print(f"{'  overhead':<44} {overhead:>12,.0f} ({overhead / plain_ns:+.1%})")
+
+    # Fill the registry as a worker would: every stage for every path, on both routes
+    for path in metrics.RESOLUTION_PATHS:
+        for route in ("/chat", "/chat/stream"):
+            with metrics.timed_request(route):
+                for name in STAGES:
+                    with metrics.stage(name):
+                        pass
+                metrics.set_path(path)
+    start = time.perf_counter_ns()
+    body = metrics.registry.render()
+    elapsed = time.perf_counter_ns() - start
+    print(f"\n/metrics render: {body.count(chr(10)):,} lines in {elapsed / 1e6:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
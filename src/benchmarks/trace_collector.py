@@ -0,0 +1,172 @@
+"""Local stand-in for an OTLP/HTTP trace collector.
+
+Accepts OTLP/JSON on POST /v1/traces, as sent by the app with
+TRACING_ENABLED=true TRACE_EXPORTER=otlp, keeps the spans in memory and
+prints the slowest traces as span trees. Each span shows its duration
+and its offset from the start of the request, so a p99 request shows
+which of its sequential round trips (principal lookup, user_data, each
+MongoDB command, fuzzy passes, OpenAI) took the time. It can also read
+traces written by TRACE_EXPORTER=file.
+
+Usage: python src/benchmarks/trace_collector.py --port 4318 --top 5
+       python src/benchmarks/trace_collector.py --file traces.jsonl --top 10
+"""
+import argparse
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+
+
+def otlp_spans(document: dict) -> Iterable[dict]:
+    """Flatten the spans of an OTLP/JSON ExportTraceServiceRequest"""
+    for resource_spans in document.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            yield from scope_spans.get("spans", [])
+
+
+def attribute_values(span: dict) -> Dict[str, object]:
+    values = {}
+    for attribute in span.get("attributes", []):
+        value = attribute.get("value", {})
+        values[attribute["key"]] = next(iter(value.values()), None)
+    return values
+
+
+class TraceStore:
+    """Spans grouped by trace id"""
+
+    def __init__(self):
+        self._traces: Dict[str, List[dict]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.documents = 0
+
+    def add(self, document: dict):
+        with self._lock:
+            self.documents += 1
+            for span in otlp_spans(document):
+                self._traces[span["traceId"]].append(span)
+
+    def slowest(self, top: int) -> List[List[dict]]:
+        """The `top` traces with the longest root span, slowest first"""
+        with self._lock:
+            traces = [list(spans) for spans in self._traces.values()]
+        rooted = [(root_span(spans), spans) for spans in traces]
+        rooted = [(root, spans) for root, spans in rooted if root is not None]
+        rooted.sort(key=lambda item: duration_ms(item[0]), reverse=True)
+        return [spans for _, spans in rooted[:top]]
+
+    def __len__(self) -> int:
+        return len(self._traces)
+
+
+def duration_ms(span: dict) -> float:
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+
+
+def root_span(spans: List[dict]) -> Optional[dict]:
+    ids = {span["spanId"] for span in spans}
+    return next((span for span in spans if span.get("parentSpanId") not in ids), None)
+
+
+def format_trace(spans: List[dict]) -> List[str]:
+    """Indented span tree: offset from the root start, duration, name and attributes"""
+    root = root_span(spans)
+    children = defaultdict(list)
+    for span in spans:
+        if span is not root:
+            children[span.get("parentSpanId")].append(span)
+    start = int(root["startTimeUnixNano"])
+    lines = [f"trace {root['traceId']}"]
+
+    def walk(span: dict, depth: int):
+        offset = (int(span["startTimeUnixNano"]) - start) / 1e6
+        attributes = " ".join(f"{key}={value}" for key, value in attribute_values(span).items())
+        error = " ERROR " + span["status"].get("message", "") if span.get("status", {}).get("code") == 2 else ""
+        lines.append(f"  +{offset:8.2f} ms {duration_ms(span):9.2f} ms  {'  ' * depth}{span['name']}  {attributes}{error}")
+        for child in sorted(children[span["spanId"]], key=lambda s: int(s["startTimeUnixNano"])):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return lines
+
+
+def print_report(store: TraceStore, top: int):
+    print(f"{len(store)} traces from {store.documents} export requests")
+    for spans in store.slowest(top):
+        print()
+        print("\n".join(format_trace(spans)))
+
+
+class Collector:
+    """Threaded HTTP server accepting OTLP/JSON trace exports"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 4318):
+        self.store = TraceStore()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1/traces"
+
+    def _handler_class(self):
+        store = self.store
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip("/") != "/v1/traces":
+                    self.send_error(404)
+                    return
+                if "json" not in self.headers.get("Content-Type", ""):
+                    # The protobuf encoding is not supported here
+                    self.send_error(415, "Send OTLP/JSON")
+                    return
+                store.add(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "Collector":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="trace-collector", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--file", help="read traces written by TRACE_EXPORTER=file instead of listening")
+    parser.add_argument("--top", type=int, default=5, help="number of slowest traces to print")
+    args = parser.parse_args()
+
+    if args.file:
+        store = TraceStore()
+        with open(args.file) as f:
+            for line in f:
+                if line.strip():
+                    store.add(json.loads(line))
+        print_report(store, args.top)
+    else:
+        collector = Collector(args.host, args.port)
+        print(f"Collecting traces on {collector.endpoint}; Ctrl-C prints the slowest")
+        try:
+            collector.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print_report(collector.store, args.top)
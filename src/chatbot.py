@@ -1,176 +1,119 @@
 import os
-from openai import OpenAI
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
-from database import DatabaseHandler
+from database import DatabaseHandler, get_database
+from executor import run_blocking
 import json
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
-from typing import Optional, Dict, Any
-from chatbot_rules import SYSTEM_RULES, MENU_STRUCTURE
+import hashlib
+from typing import Optional, Dict, Any, AsyncIterator
+from chatbot_rules import SYSTEM_RULES, MENU_STRUCTURE, RULES_VERSION
+from menu_machine import MenuMachine, ROOT
+from response_template import ResponseTemplate
+from session_store import SessionState, create_session_store
+from intent_cache import IntentCache, is_intent_analysis
+from semantic_cache import SemanticIntentCache, SEMANTIC_CACHE_ENABLED
+from singleflight import SingleFlight, AsyncSingleFlight
+from intent_batcher import IntentBatcher, LLM_BATCH_ENABLED
+from circuit_breaker import CircuitBreaker
+import metrics
+import tracing
 
 load_dotenv()
 
+INTENT_MODEL = "gpt-3.5-turbo"
+
+# Per-attempt HTTP timeout for OpenAI, and the total time a message may
+# spend waiting on intent analysis before falling back to the main menu
+OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', '3'))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '0'))
+LLM_LATENCY_BUDGET_SECONDS = float(os.getenv('LLM_LATENCY_BUDGET_SECONDS', '4'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30'))
+
+# Navigation table and prerendered menus; a malformed MENU_STRUCTURE fails here, at import
+MENU = MenuMachine(MENU_STRUCTURE)
+# user_data fields shown in menu details
+MENU_USER_FIELDS = frozenset({"user_id", "account_number", "status", "plan_type", "monthly_fee"})
+
 class TelecomChatbot:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.db = DatabaseHandler()
-        self.last_intent = None
+    def __init__(self, db: Optional[DatabaseHandler] = None):
+        self.client = OpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=os.getenv('OPENAI_API_KEY'),
+            timeout=OPENAI_TIMEOUT_SECONDS,
+            max_retries=OPENAI_MAX_RETRIES
+        )
+        # Skips OpenAI entirely after repeated failures
+        self.llm_breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+        # Shares the process-wide connection pool and keyword matcher unless given one
+        self.db = db if db is not None else get_database()
         self.system_rules = SYSTEM_RULES
         self.menu_structure = MENU_STRUCTURE
-        self.menu_history = []  # Track menu navigation history
-        
-        # Initialize predefined responses
-        self._initialize_responses()
-
-    def _initialize_responses(self):
-        """Initialize predefined responses in the database"""
-        # Network issues
-        self.db.add_response("network_issues", {
-            "intent_name": "network_issues",
-            "response_template": "I understand you're experiencing network issues. Let me help you troubleshoot. First, could you please try turning your device off and on again? If the issue persists, I can help you check your signal strength and network settings."
-        })
-
-        # Billing issues
-        self.db.add_response("billing_issues", {
-            "intent_name": "billing_issues",
-            "response_template": "I can help you with your billing concerns. Could you please provide your account number or the last 4 digits of your phone number? This will help me access your billing information securely."
-        })
-
-        # Account management
-        self.db.add_response("account_management", {
-            "intent_name": "account_management",
-            "response_template": "I can help you manage your account. What specific changes would you like to make? Options include updating personal information, changing your plan, or modifying your payment method."
-        })
-
-        # Data usage
-        self.db.add_response("data_usage", {
-            "intent_name": "data_usage",
-            "response_template": "I can help you check your data usage. Would you like to know your current usage, remaining data, or would you like to purchase additional data?"
-        })
-
-        # Plan information
-        self.db.add_response("plan_info", {
-            "intent_name": "plan_info",
-            "response_template": "I can provide information about our available plans. Would you like to know about our current promotions, compare plans, or get details about your current plan?"
-        })
-
-        # Payment issues
-        self.db.add_response("payment_issues", {
-            "intent_name": "payment_issues",
-            "response_template": "I understand you're having issues with your payment. I can help you with payment processing, setting up automatic payments, or resolving any payment-related concerns."
-        })
-
-        # Technical support
-        self.db.add_response("technical_support", {
-            "intent_name": "technical_support",
-            "response_template": "I can help you with technical support. Please describe the issue you're experiencing, and I'll guide you through the troubleshooting process."
-        })
-
-        # General inquiries
-        self.db.add_response("general_inquiry", {
-            "intent_name": "general_inquiry",
-            "response_template": "I'm here to help you with any questions about our services. What would you like to know?"
-        })
-
-    def analyze_intent(self, message: str) -> dict:
+        self.menu = MENU
+        # Per-user last intent and menu navigation history
+        self.sessions = create_session_store(self.db)
+        # Cached OpenAI intent analyses, invalidated when the prompt or rules change
+        self.intent_cache = IntentCache(self._prompt_fingerprint(), self.db)
+        # Nearest-neighbour reuse of intents for paraphrased messages
+        self.semantic_cache = SemanticIntentCache() if SEMANTIC_CACHE_ENABLED else None
+        # Coalesces concurrent OpenAI requests for the same normalized message
+        self.llm_flight = SingleFlight()
+        self.async_llm_flight = AsyncSingleFlight()
+        # Optional micro-batching of async OpenAI intent requests
+        self.intent_batcher = IntentBatcher(self._complete_intents_batch_async, breaker=self.llm_breaker) if LLM_BATCH_ENABLED else None
+
+    @property
+    def user_data_fields(self) -> frozenset:
+        """The user_data fields a chat turn can use: menu details and every template placeholder"""
+        return MENU_USER_FIELDS | self.db.response_template_fields
+
+    def analyze_intent(self, message: str, session: Optional[SessionState] = None) -> dict:
         """Use OpenAI to analyze the user's intent and extract relevant information"""
+        intent_analysis = self._match_intent(message, session)
+        if intent_analysis:
+            return intent_analysis
+
+        # If no keyword match found, use OpenAI for intent analysis
+        return self._analyze_with_openai(message)
+
+    def _match_intent(self, message: str, session: Optional[SessionState] = None) -> Optional[dict]:
+        """Resolve the intent from menus, greetings and keywords, or None if OpenAI is needed"""
         # Check if the message is a numbered response
         if message.strip().isdigit():
-            return self.handle_numbered_response(message)
+            metrics.set_path("menu")
+            return self.handle_numbered_response(message, session or SessionState())
             
         # Handle greetings
         greetings = ["hi", "hello", "hey", "good morning", "good afternoon", "good evening"]
         if message.lower() in greetings:
+            metrics.set_path("exact")
             return {
                 "intent": "main_menu",
                 "entities": {},
                 "urgency": "low"
             }
             
-        # First check database keywords for matches
-        message_lower = message.lower()
-        words = message_lower.split()
-        
-        # Get all keywords and their intents from database
-        keywords = self.db.get_all_keywords()
-        if not keywords:
+        # First check the compiled keyword matcher
+        if not self.db.keyword_cache:
             # If no keywords found, proceed with OpenAI analysis
-            return self._analyze_with_openai(message)
-        
-        # Try to find matching intent from keywords
-        best_match = None
-        best_score = 0
-        best_keyword = None
-        
-        # Common misspellings and phonetic variations
-        phonetic_variations = {
-            'pay': ['pai', 'pae', 'pey', 'paiy'],
-            'bill': ['bil', 'bll', 'bile'],
-            'account': ['acount', 'acct', 'accnt'],
-            'support': ['suport', 'soport', 'supprt'],
-            'data': ['date', 'dta', 'dtaa'],
-            'plan': ['pln', 'plann', 'plane'],
-            'service': ['servis', 'servce', 'srvice'],
-            'payment': ['paymnt', 'paymet', 'pament'],
-            'balance': ['balnce', 'balanc', 'balence'],
-            'usage': ['usge', 'usag', 'usgae']
-        }
-        
-        for word in words:
-            # Check for exact matches first
-            for keyword, intent in keywords.items():
-                if word == keyword.lower():
-                    return {
-                        "intent": intent,
-                        "entities": {
-                            "amount": None,
-                            "date": None,
-                            "account_number": None,
-                            "plan_type": None
-                        },
-                        "urgency": "low"
-                    }
-            
-            # Check for phonetic variations
-            for correct_word, variations in phonetic_variations.items():
-                if word in variations:
-                    # Find the intent for the correct word
-                    for keyword, intent in keywords.items():
-                        if correct_word in keyword.lower():
-                            return {
-                                "intent": intent,
-                                "entities": {
-                                    "amount": None,
-                                    "date": None,
-                                    "account_number": None,
-                                    "plan_type": None
-                                },
-                                "urgency": "low"
-                            }
-            
-            # If no exact match, try fuzzy matching
-            for keyword, intent in keywords.items():
-                # Calculate multiple similarity scores
-                ratio_score = fuzz.ratio(word, keyword.lower())
-                partial_score = fuzz.partial_ratio(word, keyword.lower())
-                token_score = fuzz.token_sort_ratio(word, keyword.lower())
-                
-                # Use the highest score
-                score = max(ratio_score, partial_score, token_score)
-                
-                # Adjust threshold based on word length
-                threshold = 80 if len(word) > 3 else 70
-                
-                if score > best_score and score >= threshold:
-                    best_score = score
-                    best_match = intent
-                    best_keyword = keyword
-        
-        if best_match:
-            # Log the correction for future reference
-            print(f"Corrected '{words[0]}' to '{best_keyword}' with score {best_score}")
+            return None
+
+        match = self.db.keyword_matcher.match(message)
+        if match:
+            # Phrases are exact matches of a multi-word keyword
+            metrics.set_path("exact" if match.path == "phrase" else match.path)
+            tracing.set_attribute("keyword.matched", match.keyword)
+            tracing.set_attribute("keyword.path", match.path)
+            if match.path == "fuzzy":
+                # Log the correction for future reference
+                print(f"Corrected '{message}' to '{match.keyword}' with score {match.score}")
             return {
-                "intent": best_match,
+                "intent": match.intent,
                 "entities": {
                     "amount": None,
                     "date": None,
@@ -179,14 +122,11 @@ class TelecomChatbot:
                 },
                 "urgency": "low"
             }
-        
-        # If no keyword match found, use OpenAI for intent analysis
-        return self._analyze_with_openai(message)
+        return None
 
-    def _analyze_with_openai(self, message: str) -> dict:
-        """Use OpenAI to analyze the user's intent when no keyword match is found"""
-        # Create a system message that combines the rules with the analysis task
-        system_message = f"""
+    def _build_system_message(self) -> str:
+        """System message that combines the rules with the analysis task"""
+        return f"""
         {self.system_rules}
 
         As a telecom customer service assistant, you must follow these rules strictly:
@@ -199,7 +139,9 @@ class TelecomChatbot:
         7. Always provide numbered options when appropriate
         8. Handle user data securely
         """
-        
+
+    def _build_intent_messages(self, message: str) -> list:
+        """Build the OpenAI chat messages for intent analysis"""
         prompt = f"""
         Analyze the following user message and extract:
         1. The main intent (must be one of: payment, billing, technical_support, account_info, plan_info, or general_query)
@@ -223,29 +165,202 @@ class TelecomChatbot:
         }}
         """
         
+        return [
+            {"role": "system", "content": self._build_system_message()},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _build_batch_intent_messages(self, messages: list) -> list:
+        """Build the OpenAI chat messages for analyzing several user messages at once"""
+        numbered = "\n".join(f"        {i}. {json.dumps(message)}" for i, message in enumerate(messages, 1))
+        prompt = f"""
+        Analyze each of the following {len(messages)} user messages independently and extract for each:
+        1. The main intent (must be one of: payment, billing, technical_support, account_info, plan_info, or general_query)
+        2. Any relevant entities (amounts, dates, account numbers)
+        3. The urgency level (high, medium, low)
+        
+        If a message is not related to telecom services, set its intent to "not_telecom".
+        
+        Messages:
+{numbered}
+        
+        Respond in JSON format with a "results" array holding exactly one object per message, in the same order, each with these fields:
+        {{
+            "intent": "string",
+            "entities": {{
+                "amount": "number or null",
+                "date": "string or null",
+                "account_number": "string or null",
+                "plan_type": "string or null"
+            }},
+            "urgency": "string"
+        }}
+        """
+        
+        return [
+            {"role": "system", "content": self._build_system_message()},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _prompt_fingerprint(self) -> str:
+        """Hash of everything besides the message that shapes the intent analysis"""
+        template = json.dumps([
+            self._build_intent_messages("{message}"),
+            self._build_batch_intent_messages(["{message}"])
+        ], sort_keys=True)
+        return hashlib.sha256(f"{INTENT_MODEL}\0{RULES_VERSION}\0{template}".encode('utf-8')).hexdigest()
+
+    def _fallback_intent(self) -> dict:
+        """Intent used when OpenAI analysis fails"""
+        return {
+            "intent": "main_menu",
+            "entities": {},
+            "urgency": "low"
+        }
+
+    def _cached_intent(self, message: str) -> Optional[dict]:
+        """Look the message up in the exact and semantic intent caches"""
+        cached = self.intent_cache.get(message)
+        if cached is None and self.semantic_cache:
+            cached = self.semantic_cache.lookup(message)
+        return cached
+
+    async def _cached_intent_async(self, message: str) -> Optional[dict]:
+        cached = await self.intent_cache.get_async(message)
+        if cached is None and self.semantic_cache:
+            cached = self.semantic_cache.lookup(message)
+        return cached
+
+    def _remember_intent(self, message: str, intent_analysis: dict):
+        """Store a fresh OpenAI analysis in the intent caches"""
+        self.intent_cache.set(message, intent_analysis)
+        if self.semantic_cache:
+            self.semantic_cache.add(message, intent_analysis)
+
+    async def _remember_intent_async(self, message: str, intent_analysis: dict):
+        await self.intent_cache.set_async(message, intent_analysis)
+        if self.semantic_cache:
+            self.semantic_cache.add(message, intent_analysis)
+
+    def _analyze_with_openai(self, message: str) -> dict:
+        """Use OpenAI to analyze the user's intent when no keyword match is found"""
+        cached = self._cached_intent(message)
+        if cached is not None:
+            metrics.set_path("llm_cache")
+            return cached
+        # _request_intent changes this to llm for the one caller that sends the request
+        metrics.set_path("llm_coalesced")
+        # Identical messages arriving together share one OpenAI request
+        return self.llm_flight.do(self.intent_cache.key(message), self._request_intent, message)
+
+    def _request_intent(self, message: str) -> dict:
+        metrics.set_path("llm")
+        if not self.llm_breaker.allow_request():
+            metrics.set_path("fallback")
+            tracing.set_attribute("llm.skipped", "breaker_open")
+            return self._fallback_intent()
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={ "type": "json_object" }
-            )
-            return json.loads(response.choices[0].message.content)
+            with tracing.span("openai.intent", {"llm.model": INTENT_MODEL, "message.length": len(message)}):
+                response = self.client.chat.completions.create(
+                    model=INTENT_MODEL,
+                    messages=self._build_intent_messages(message),
+                    response_format={ "type": "json_object" },
+                    # The sync path has no event loop to cancel on, so the budget caps the HTTP call
+                    timeout=min(OPENAI_TIMEOUT_SECONDS, LLM_LATENCY_BUDGET_SECONDS)
+                )
+                intent_analysis = self._checked_intent(json.loads(response.choices[0].message.content))
         except Exception as e:
+            self.llm_breaker.record_failure()
             print(f"Error analyzing intent with OpenAI: {str(e)}")
-            return {
-                "intent": "main_menu",
-                "entities": {},
-                "urgency": "low"
-            }
+            metrics.set_path("fallback")
+            return self._fallback_intent()
+        self.llm_breaker.record_success()
+        self._remember_intent(message, intent_analysis)
+        return intent_analysis
+
+    async def _analyze_with_openai_async(self, message: str) -> dict:
+        """Non-blocking variant of _analyze_with_openai for async callers"""
+        cached = await self._cached_intent_async(message)
+        if cached is not None:
+            metrics.set_path("llm_cache")
+            return cached
+        metrics.set_path("llm_coalesced")
+        return await self.async_llm_flight.do(self.intent_cache.key(message), self._request_intent_async, message)
+
+    async def _request_intent_async(self, message: str) -> dict:
+        # The shared task runs in a copy of the first caller's context, so this only marks that caller
+        metrics.set_path("llm")
+        if not self.llm_breaker.allow_request():
+            metrics.set_path("fallback")
+            tracing.set_attribute("llm.skipped", "breaker_open")
+            return self._fallback_intent()
+        try:
+            attributes = {"llm.model": INTENT_MODEL, "message.length": len(message),
+                          "llm.batched": self.intent_batcher is not None}
+            with tracing.span("openai.intent", attributes):
+                if self.intent_batcher:
+                    request = self.intent_batcher.classify(message)
+                else:
+                    request = self._complete_intent_async(message)
+                intent_analysis = self._checked_intent(await asyncio.wait_for(request, LLM_LATENCY_BUDGET_SECONDS))
+        except Exception as e:
+            # The batcher records each batch's outcome once; one failed batch is one failure
+            if not self.intent_batcher:
+                self.llm_breaker.record_failure()
+            print(f"Error analyzing intent with OpenAI: {str(e) or type(e).__name__}")
+            metrics.set_path("fallback")
+            return self._fallback_intent()
+        if not self.intent_batcher:
+            self.llm_breaker.record_success()
+        await self._remember_intent_async(message, intent_analysis)
+        return intent_analysis
+
+    @staticmethod
+    def _checked_intent(intent_analysis) -> dict:
+        """The parsed OpenAI reply, or ValueError if it names no intent so it is never cached"""
+        if not is_intent_analysis(intent_analysis):
+            raise ValueError(f"OpenAI reply has no intent: {json.dumps(intent_analysis)[:200]}")
+        return intent_analysis
+
+    async def _complete_intent_async(self, message: str) -> dict:
+        """Send a single intent analysis request"""
+        response = await self.async_client.chat.completions.create(
+            model=INTENT_MODEL,
+            messages=self._build_intent_messages(message),
+            response_format={ "type": "json_object" }
+        )
+        return json.loads(response.choices[0].message.content)
+
+    async def _complete_intents_batch_async(self, messages: list) -> list:
+        """Analyze several messages in one request, one result per message in order"""
+        if len(messages) == 1:
+            return [await self._complete_intent_async(messages[0])]
+
+        response = await self.async_client.chat.completions.create(
+            model=INTENT_MODEL,
+            messages=self._build_batch_intent_messages(messages),
+            response_format={ "type": "json_object" }
+        )
+        results = json.loads(response.choices[0].message.content).get("results")
+        if not isinstance(results, list) or len(results) != len(messages):
+            # The model did not return one result per message; ask for each separately
+            print(f"Batched intent analysis returned an unusable result for {len(messages)} messages, retrying individually")
+            results = [None] * len(messages)
+        retry = [i for i, result in enumerate(results) if not is_intent_analysis(result)]
+        if retry:
+            if len(retry) < len(messages):
+                print(f"Batched intent analysis returned {len(retry)} results without an intent, retrying those")
+            # Results still without an intent fall back in _request_intent_async and are not cached
+            retried = await asyncio.gather(*(self._complete_intent_async(messages[i]) for i in retry))
+            for i, result in zip(retry, retried):
+                results[i] = result
+        return results
 
-    def handle_numbered_response(self, message: str) -> dict:
-        """Handle numbered responses based on the last intent"""
+    def handle_numbered_response(self, message: str, session: SessionState) -> dict:
+        """Handle numbered responses based on the session's last intent"""
         number = int(message.strip())
         
-        if not self.last_intent:
+        if not session.last_intent:
             # If no last intent, treat as main menu selection
             return {
                 "intent": "main_menu",
@@ -254,23 +369,19 @@ class TelecomChatbot:
             }
             
         # Get the mapped intent based on the last intent and number
-        if self.last_intent in self.menu_structure and number in self.menu_structure[self.last_intent]["options"]:
-            mapped_intent = {
-                "intent": self.menu_structure[self.last_intent]["options"][number]["intent"],
-                "entities": {}
-            }
-            
+        transition = self.menu.transition(session.last_intent, number)
+        if transition is not None:
             # Handle back navigation
-            if mapped_intent["intent"] == "main_menu":
+            if transition.resets_history:
                 # Clear history and go back to main menu
-                self.menu_history = []
+                session.menu_history = []
             else:
                 # Add current menu to history
-                self.menu_history.append(self.last_intent)
+                session.menu_history.append(session.last_intent)
             
             # Update the last intent to the mapped intent for next numbered response
-            self.last_intent = mapped_intent["intent"]
-            return mapped_intent
+            session.last_intent = transition.target
+            return {"intent": transition.target, "entities": {}}
             
         return {
             "intent": "general_query",
@@ -278,147 +389,203 @@ class TelecomChatbot:
             "urgency": "low"
         }
 
-    def get_rule_response(self, intent: str, user_id: str, entities: dict) -> str:
-        """Get the appropriate response based on the intent and user data"""
+    def get_rule_response(self, intent: str, user_id: str, entities: dict, session: Optional[SessionState] = None,
+                          user_data: Optional[Dict[str, Any]] = None) -> str:
+        """Get the appropriate response based on the intent and user data.
+
+        Pass the request's user_data when the caller already has it; it is
+        only fetched by user_id otherwise.
+        """
+        session = session or SessionState()
         # Store the intent for handling numbered responses
-        self.last_intent = intent
+        session.last_intent = intent
         
         # Check if the query is telecom-related
         if intent == "not_telecom":
             return "I apologize, but I can only help with telecom-related issues. Please ask about your phone service, internet, billing, or account information."
 
         # Handle main menu
-        if intent == "main_menu":
-            welcome_message = f"""Welcome to Telecom Support! I'm here to help you with your telecom needs. I follow a structured menu system to assist you effectively.
+        if intent == ROOT:
+            return self.menu.welcome
 
-Here's what I can help you with:"""
-
-            # Add menu options from MENU_STRUCTURE
-            for option_num, option in self.menu_structure["main_menu"]["options"].items():
-                welcome_message += f"\n{option_num}. {option['text']}"
-                # Add sub-options if available
-                if option["intent"] in self.menu_structure:
-                    for sub_option_num, sub_option in self.menu_structure[option["intent"]]["options"].items():
-                        welcome_message += f"\n   - {sub_option['text']}"
-
-            welcome_message += "\n\nPlease select a number (1-5) to get started with the service you need help with."
-            return welcome_message
-
-        # Get user data if needed
-        user_data = self.db.get_user_data(user_id)
-        
         # Handle numbered responses separately
-        if intent in self.menu_structure:
-            return self.handle_numbered_menu_response(intent, user_data)
+        if intent in self.menu:
+            if user_data is None and user_id:
+                user_data = self.db.get_user_data(user_id, MENU_USER_FIELDS)
+            return self.handle_numbered_menu_response(intent, user_data, session)
         
         # Get response from database based on intent
-        response_template = self.db.get_response_by_intent(intent)
-        if not response_template:
+        template = self.db.get_response_template(intent)
+        if template is None:
             return "I'm not sure how to help with that specific telecom issue. Could you please provide more details about your phone service, internet, billing, or account?"
 
-        # Replace placeholders in template with actual data
-        response = response_template
-        if user_data:
-            for key, value in user_data.items():
-                response = response.replace(f"{{{key}}}", str(value))
-        
-        # Add any relevant entity information
-        if entities:
-            for key, value in entities.items():
-                if value:
-                    response = response.replace(f"{{{key}}}", str(value))
-        
-        return response
+        # Fill placeholders from user data, then from entities
+        return template.render(self._template_user_data(template, user_id, user_data), entities)
 
-    def handle_numbered_menu_response(self, intent: str, user_data: dict) -> str:
+    def _template_user_data(self, template: ResponseTemplate, user_id: Optional[str],
+                            user_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """user_data holding the template's fields, fetching only those it lacks"""
+        if not user_id or not template.fields:
+            return user_data
+        if user_data is None:
+            return self.db.get_user_data(user_id, template.fields)
+        if template.fields <= user_data.keys():
+            return user_data
+        # Usually a cache hit: the caller's read already covered these fields
+        fetched = self.db.get_user_data(user_id, template.fields)
+        return {**fetched, **user_data} if fetched else user_data
+
+    def handle_numbered_menu_response(self, intent: str, user_data: dict, session: Optional[SessionState] = None) -> str:
         """Handle responses for numbered menu options"""
         if not user_data:
             return "I apologize, but I couldn't find your account information. Please make sure you're logged in with a valid user ID."
             
         try:
-            # Get the menu structure for the current intent
-            menu = self.menu_structure.get(intent, {})
-            if not menu:
+            if intent not in self.menu:
                 return "I'm not sure how to help with that specific option. Please try again."
 
-            # Build the response based on the menu structure
-            response = f"{menu['title']}\n\n"
-            
             # Add user data if available
+            details = ""
             if intent == "account_info":
-                response += f"Your account {user_data.get('account_number', 'N/A')} is currently {user_data.get('status', 'N/A')}. "
-                response += f"Your plan is {user_data.get('plan_type', 'N/A')} with a monthly fee of {user_data.get('monthly_fee', 'N/A')}.\n\n"
+                details = (f"Your account {user_data.get('account_number', 'N/A')} is currently {user_data.get('status', 'N/A')}. "
+                           f"Your plan is {user_data.get('plan_type', 'N/A')} with a monthly fee of {user_data.get('monthly_fee', 'N/A')}.\n\n")
             
-            # Add menu options
-            response += "Would you like to:\n"
-            for option_num, option in menu["options"].items():
-                response += f"{option_num}. {option['text']}\n"
-            
-            # Add back option if not in main menu
-            if intent != "main_menu" and len(self.menu_history) > 0:
-                response += "\nOr type 'back' to return to the previous menu."
-            
-            return response
+            # Prerendered title and options, plus the back option if not in main menu
+            show_back = intent != ROOT and session is not None and len(session.menu_history) > 0
+            return self.menu.render(intent, details, show_back)
             
         except Exception as e:
             print(f"Error in handle_numbered_menu_response: {str(e)}")
             return "I apologize, but I encountered an error while processing your request. Please try again."
 
-    def get_response(self, message: str, user_data: Optional[Dict[str, Any]] = None) -> str:
+    def _session_id(self, user_data: Optional[Dict[str, Any]], session_id: Optional[str]) -> Optional[str]:
+        # Callers without a session id or user get a fresh session per call, never a shared one
+        return session_id or (user_data.get("user_id") if user_data else None)
+
+    def get_response(self, message: str, user_data: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> str:
         """
         Get response for user message using OpenAI API and predefined responses
         """
+        session_id = self._session_id(user_data, session_id)
+        tracing.set_attribute("message.length", len(message))
+        with metrics.stage("session_load"):
+            session = self.sessions.get(session_id) if session_id else SessionState()
         try:
-            # Handle back command
-            if message.lower().strip() == 'back':
-                if len(self.menu_history) > 0:
-                    # Go back to previous menu
-                    self.last_intent = self.menu_history.pop()
-                    return self.get_rule_response(
-                        self.last_intent,
-                        user_data.get("_id") if user_data else None,
-                        {}
-                    )
-                else:
-                    # If no history, go to main menu
-                    self.last_intent = "main_menu"
-                    return self.get_rule_response(
-                        "main_menu",
-                        user_data.get("_id") if user_data else None,
-                        {}
-                    )
-
-            # Check if the message is a numbered response
-            if message.strip().isdigit():
-                # Get the intent based on the numbered response
-                intent_analysis = self.handle_numbered_response(message)
-                # Get the rule-based response for this intent
-                return self.get_rule_response(intent_analysis["intent"], user_data.get("_id") if user_data else None, intent_analysis.get("entities", {}))
-
-            # First, try to match with predefined responses
-            intent = self.db.get_intent_by_keyword(message.lower())
-            if intent:
-                # Store the intent for future numbered responses
-                self.last_intent = intent
-                response = self.db.get_response_by_intent(intent)
-                if response:
-                    return response
-
-            # If no predefined response, analyze intent
-            intent_analysis = self.analyze_intent(message)
+            response = self._respond_without_llm(message, user_data, session)
+            if response is None:
+                with metrics.stage("llm"):
+                    intent_analysis = self._analyze_with_openai(message)
+                response = self._respond_to_analysis(intent_analysis, user_data, session)
+            return response
+        except Exception as e:
+            print(f"Error getting response: {str(e)}")
+            metrics.set_path("error")
+            return "I apologize, but I'm having trouble processing your request. Please try again later."
+        finally:
+            if session_id:
+                with metrics.stage("session_save"):
+                    self.sessions.save(session_id, session)
+
+    async def get_response_async(self, message: str, user_data: Optional[Dict[str, Any]] = None, session_id: Optional[str] = None) -> str:
+        """
+        Async variant of get_response: the OpenAI call is awaited and the
+        blocking database and matching work runs on the bounded pool
+        """
+        parts = []
+        async for event in self.stream_response(message, user_data, session_id):
+            if event["type"] == "delta":
+                parts.append(event["text"])
+        return "".join(parts)
+
+    async def stream_response(self, message: str, user_data: Optional[Dict[str, Any]] = None,
+                              session_id: Optional[str] = None) -> AsyncIterator[Dict[str, str]]:
+        """
+        Yield the response as events: a "status" event while waiting on
+        OpenAI, then "delta" events whose texts join up to the full response
+        """
+        session_id = self._session_id(user_data, session_id)
+        tracing.set_attribute("message.length", len(message))
+        with metrics.stage("session_load"):
+            session = await run_blocking(self.sessions.get, session_id) if session_id else SessionState()
+        try:
+            response = await run_blocking(self._respond_without_llm, message, user_data, session)
+            if response is None:
+                yield {"type": "status", "text": "Let me look into that for you..."}
+                with metrics.stage("llm"):
+                    intent_analysis = await self._analyze_with_openai_async(message)
+                response = await run_blocking(self._respond_to_analysis, intent_analysis, user_data, session)
+        except Exception as e:
+            print(f"Error getting response: {str(e)}")
+            metrics.set_path("error")
+            response = "I apologize, but I'm having trouble processing your request. Please try again later."
+        finally:
+            if session_id:
+                with metrics.stage("session_save"):
+                    await run_blocking(self.sessions.save, session_id, session)
+        yield {"type": "delta", "text": response}
+
+    def _respond_without_llm(self, message: str, user_data: Optional[Dict[str, Any]], session: SessionState) -> Optional[str]:
+        """Answer from menus, keywords and templates, or return None if OpenAI is needed"""
+        user_id = user_data.get("user_id") if user_data else None
+
+        # Handle back command
+        if message.lower().strip() == 'back':
+            if len(session.menu_history) > 0:
+                # Go back to previous menu
+                session.last_intent = session.menu_history.pop()
+            else:
+                # If no history, go to main menu
+                session.last_intent = "main_menu"
+            metrics.set_path("menu")
+            with metrics.stage("rule_response"):
+                return self.get_rule_response(session.last_intent, user_id, {}, session, user_data)
+
+        # Check if the message is a numbered response
+        if message.strip().isdigit():
+            metrics.set_path("menu")
+            # Get the intent based on the numbered response
+            with metrics.stage("intent_match"):
+                intent_analysis = self.handle_numbered_response(message, session)
+            # Get the rule-based response for this intent
+            with metrics.stage("rule_response"):
+                return self.get_rule_response(intent_analysis["intent"], user_id, intent_analysis.get("entities", {}), session, user_data)
+
+        # First, try to match with predefined responses
+        with metrics.stage("keyword_lookup"):
+            keyword = message.lower()
+            intent = self.db.get_intent_by_keyword(keyword)
+        if intent:
+            tracing.set_attribute("intent", intent)
+            metrics.set_path("exact" if keyword in self.db.keyword_matcher.exact else "fuzzy")
             # Store the intent for future numbered responses
-            self.last_intent = intent_analysis["intent"]
-            
-            # Get rule-based response
+            session.last_intent = intent
+            with metrics.stage("rule_response"):
+                template = self.db.get_response_template(intent)
+                response = template.render(self._template_user_data(template, user_id, user_data)) if template else None
+            if response:
+                return response
+
+        # If no predefined response, analyze intent
+        with metrics.stage("intent_match"):
+            intent_analysis = self._match_intent(message, session)
+        if intent_analysis is None:
+            return None
+        return self._respond_to_analysis(intent_analysis, user_data, session)
+
+    def _respond_to_analysis(self, intent_analysis: dict, user_data: Optional[Dict[str, Any]], session: SessionState) -> str:
+        """Build the rule-based response for an analyzed intent"""
+        # Store the intent for future numbered responses
+        session.last_intent = intent_analysis["intent"]
+        
+        # Get rule-based response
+        with metrics.stage("rule_response"):
             return self.get_rule_response(
                 intent_analysis["intent"],
-                user_data.get("_id") if user_data else None,
-                intent_analysis.get("entities", {})
+                user_data.get("user_id") if user_data else None,
+                intent_analysis.get("entities", {}),
+                session,
+                user_data
             )
-            
-        except Exception as e:
-            print(f"Error getting response: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request. Please try again later."
 
     def close(self):
         """Close database connection"""
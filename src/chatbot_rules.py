@@ -1,5 +1,9 @@
 """System rules and configuration for the Telecom Chatbot."""
 
+# Bump whenever SYSTEM_RULES or MENU_STRUCTURE change meaning, so cached
+# intent analyses produced under the old rules are not reused
+RULES_VERSION = "1"
+
 SYSTEM_RULES = """You are a Telecom Customer Service Chatbot with the following rules and capabilities:
 
 1. Menu Navigation:
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Callable, Dict
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency until it has had time to recover.
+
+    closed: calls go through and consecutive failures are counted.
+    open: after failure_threshold consecutive failures, calls are refused
+          for reset_timeout seconds.
+    half_open: after that, a single trial call is let through; its success
+               closes the circuit and its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = None
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go ahead now"""
+        with self._lock:
+            now = self._clock()
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_started_at = None
+            if self.state == self.HALF_OPEN:
+                # Let one trial through; replace it if it never reported back
+                if self._trial_started_at is None or now - self._trial_started_at >= self.reset_timeout:
+                    self._trial_started_at = now
+                    return True
+            if self.state == self.CLOSED:
+                return True
+            self._counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self._counters["opened"] += 1
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+                self._trial_started_at = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                **{f"{name}_total": value for name, value in self._counters.items()}
+            }
@@ -1,20 +1,173 @@
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import MongoClient, monitoring
+from pymongo.errors import BulkWriteError
+from datetime import datetime, timedelta
+import base64
+import copy
+import calendar
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from fuzzywuzzy import fuzz
-from fuzzywuzzy import process
-import bcrypt
-from typing import Optional, Dict, Tuple, Any
+from typing import Optional, Dict, Tuple, Any, Iterable
 from bson import ObjectId
 import json
+from keyword_index import KeywordMatcher
+from cache import LRUCache
+from response_template import ResponseTemplate
+from migrations import ensure_schema
+import tracing
 
 load_dotenv()
 
-class DatabaseHandler:
+# Connection pool sizing, per process. With N workers the deployment opens
+# at most N * MONGODB_MAX_POOL_SIZE connections.
+MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '300000'))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+
+# Read-through cache of user_data documents. Writes through this handler
+# invalidate it at once; other workers see changes within the TTL.
+USER_DATA_CACHE_TTL_SECONDS = int(os.getenv('USER_DATA_CACHE_TTL_SECONDS', '30'))
+USER_DATA_CACHE_MAX_SIZE = int(os.getenv('USER_DATA_CACHE_MAX_SIZE', '10000'))
+# Compiled response templates. add_response recompiles at once; edits made
+# elsewhere are picked up within the TTL.
+RESPONSE_TEMPLATE_TTL_SECONDS = int(os.getenv('RESPONSE_TEMPLATE_TTL_SECONDS', '300'))
+
+# Layout of chat_history records: {v, u: user id, m: message, r: response, ts}
+CHAT_RECORD_VERSION = 1
+
+
+def encode_history_cursor(ts: datetime, record_id: ObjectId) -> str:
+    """Opaque page cursor for the chat_history record (ts, _id)"""
+    millis = calendar.timegm(ts.utctimetuple()) * 1000 + ts.microsecond // 1000
+    return base64.urlsafe_b64encode(f"{millis}:{record_id}".encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_history_cursor; raises ValueError when the cursor is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        millis, record_id = raw.split(":")
+        return datetime(1970, 1, 1) + timedelta(milliseconds=int(millis)), ObjectId(record_id)
+    except Exception:
+        raise ValueError("Invalid history cursor")
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool utilization counters fed by pymongo pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.checkouts += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_pool_size": MONGODB_MAX_POOL_SIZE,
+                "open": self.open,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures
+            }
+
+
+class CommandTracer(monitoring.CommandListener):
+    """One span per MongoDB command issued while a request is being traced"""
+
     def __init__(self):
+        self._spans: Dict[Tuple[int, Any], tracing.Span] = {}
+
+    def started(self, event):
+        # Runs on the thread issuing the command, so the request's span is current
+        span = tracing.start_span(f"mongodb.{event.command_name}", {
+            "db.system": "mongodb",
+            "db.name": event.database_name,
+            "db.operation": event.command_name,
+        })
+        if span is not None:
+            collection = event.command.get(event.command_name)
+            if isinstance(collection, str):
+                span.set_attribute("db.mongodb.collection", collection)
+            self._spans[(event.request_id, event.connection_id)] = span
+
+    def succeeded(self, event):
+        span = self._spans.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.end()
+
+    def failed(self, event):
+        span = self._spans.pop((event.request_id, event.connection_id), None)
+        if span is not None:
+            span.end()
+            span.error = str(event.failure)
+
+
+class DatabaseHandler:
+    def __init__(self, check_schema: bool = True):
         # Connect to MongoDB
-        self.client = MongoClient(os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'))
+        self.pool_metrics = PoolMetrics()
+        self.client = MongoClient(
+            os.getenv('MONGODB_URI', 'mongodb://localhost:27017/'),
+            maxPoolSize=MONGODB_MAX_POOL_SIZE,
+            minPoolSize=MONGODB_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGODB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            event_listeners=[self.pool_metrics] + ([CommandTracer()] if tracing.tracer.enabled else [])
+        )
         self.db = self.client['chatbot']
         
         # Initialize collections
@@ -25,27 +178,17 @@ class DatabaseHandler:
         self.response = self.db['response']
         self.users = self.db['users']
         self.user_data = self.db['user_data']
+        self.user_data_cache = LRUCache(max_size=USER_DATA_CACHE_MAX_SIZE, ttl=USER_DATA_CACHE_TTL_SECONDS)
+        self.response_templates = LRUCache(ttl=RESPONSE_TEMPLATE_TTL_SECONDS)
+        # Every placeholder seen in a compiled template: the user_data fields a chat turn may need
+        self.response_template_fields = frozenset()
         
-        # Create indexes
-        self._create_indexes()
+        # Indexes and seed data are versioned migrations; when up to date this is one read
+        self.schema_ready = ensure_schema(self) if check_schema else True
         
         # Cache keywords for faster fuzzy matching
         self._cache_keywords()
-
-    def store_chat_history(self, user_id: str, message: str, response: str) -> bool:
-        """Store a chat message and response in the chat history"""
-        try:
-            chat_doc = {
-                "user_id": user_id,
-                "message": message,
-                "response": response,
-                "timestamp": datetime.utcnow()
-            }
-            self.chat_history.insert_one(chat_doc)
-            return True
-        except Exception as e:
-            print(f"Error storing chat history: {str(e)}")
-            return False
+        self._cache_response_templates()
 
     def add_response(self, intent_name: str, response_data: Dict[str, Any]) -> bool:
         """Add a predefined response to the database"""
@@ -61,6 +204,7 @@ class DatabaseHandler:
             else:
                 # Insert new response
                 self.response.insert_one(response_data)
+            self.response_templates.delete(intent_name)
             
             # Add intent if it doesn't exist
             existing_intent = self.intent.find_one({"intent_name": intent_name})
@@ -96,48 +240,23 @@ class DatabaseHandler:
         return doc
 
     def _cache_keywords(self):
-        """Cache keywords for faster fuzzy matching"""
+        """Cache keywords and compile the matcher used for intent analysis"""
         self.keyword_cache = [(doc["keyword"], doc["intent_name"]) for doc in self.keyword.find()]
-
-    def _create_indexes(self):
-        """Create necessary indexes for collections"""
-        # Index for chat_history
-        self.chat_history.create_index([("user_id", 1), ("timestamp", -1)])
-        
-        # Index for intent
-        self.intent.create_index([("intent_name", 1)], unique=True)
-        
-        # Index for keyword
-        self.keyword.create_index([("keyword", 1)], unique=True)
-        
-        # Index for response
-        self.response.create_index([("intent_name", 1)])
-        
-        # Indexes for users
-        self.users.create_index([("username", 1)], unique=True)
-        self.users.create_index([("email", 1)], unique=True)
-        
-        # Indexes for user_data
-        self.user_data.create_index("user_id", unique=True)
-        self.user_data.create_index("account_number", unique=True)
-        self.user_data.create_index("email", unique=True)
+        self.keyword_matcher = KeywordMatcher(self.keyword_cache)
 
     # User Management Methods
-    def create_user(self, username: str, email: str, password: str) -> bool:
-        """Create a new user"""
+    def insert_user(self, username: str, email: str, password_hash: bytes) -> bool:
+        """Create a new user from an already hashed password"""
         try:
             # Check if username or email already exists
             if self.users.find_one({"$or": [{"username": username}, {"email": email}]}):
                 return False
             
-            # Hash password
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-            
             # Create user document
             user_doc = {
                 "username": username,
                 "email": email,
-                "password": hashed_password,
+                "password": password_hash,
                 "created_at": datetime.utcnow(),
                 "is_active": True
             }
@@ -158,30 +277,29 @@ class DatabaseHandler:
             print(f"Error creating user: {str(e)}")
             return False
 
-    def verify_user(self, username: str, password: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
-        """Verify user credentials"""
-        try:
-            user = self.users.find_one({"username": username})
-            if not user:
-                return False, "User not found", None
-            
-            if not bcrypt.checkpw(password.encode('utf-8'), user["password"]):
-                return False, "Incorrect password", None
-            
-            # Update last login
-            self.users.update_one(
-                {"_id": user["_id"]},
-                {"$set": {"last_login": datetime.utcnow()}}
-            )
-            
-            # Remove password and serialize user object
-            user.pop("password", None)
-            serialized_user = self._serialize_doc(user)
-            return True, "Login successful", serialized_user
-            
-        except Exception as e:
-            print(f"Error verifying user: {str(e)}")
-            return False, f"Error during verification: {str(e)}", None
+    def get_user_credentials(self, username: str) -> Optional[Dict[str, Any]]:
+        """Get the raw user document, password hash included, for credential checks"""
+        return self.users.find_one({"username": username})
+
+    def record_login(self, user_id: Any, password_hash: Optional[bytes] = None):
+        """Stamp last_login, storing a rehashed password in the same write when given"""
+        update = {"last_login": datetime.utcnow()}
+        if password_hash is not None:
+            update["password"] = password_hash
+        self.users.update_one({"_id": ObjectId(user_id) if isinstance(user_id, str) else user_id}, {"$set": update})
+
+    def set_password_hash(self, username: str, password_hash: bytes) -> bool:
+        """Replace a user's password hash"""
+        result = self.users.update_one(
+            {"username": username},
+            {"$set": {"password": password_hash}}
+        )
+        return result.modified_count > 0
+
+    def public_user(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        """Remove the password and serialize a user document for API responses"""
+        user.pop("password", None)
+        return self._serialize_doc(user)
 
     def get_user_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Get user by username"""
@@ -195,6 +313,28 @@ class DatabaseHandler:
             print(f"Error getting user: {str(e)}")
             return None
 
+    def is_admin(self, user_id: str) -> bool:
+        """Whether the user document carries the admin flag set by admin_users.py"""
+        try:
+            user = self.users.find_one({"_id": ObjectId(user_id) if isinstance(user_id, str) else user_id}, {"is_admin": 1})
+            return bool(user and user.get("is_admin"))
+        except Exception as e:
+            print(f"Error checking admin flag: {str(e)}")
+            return False
+
+    def set_admin(self, username: str, is_admin: bool) -> bool:
+        """Grant or withdraw access to the /admin routes; False if there is no such user"""
+        result = self.users.update_one({"username": username}, {"$set": {"is_admin": is_admin}})
+        return result.matched_count > 0
+
+    def deactivate_user(self, username: str) -> bool:
+        """Mark a user inactive, whether or not they already were; False if there is no such user"""
+        result = self.users.update_one({"username": username}, {"$set": {"is_active": False}})
+        return result.matched_count > 0
+
+    def get_admin_usernames(self) -> list:
+        return [doc["username"] for doc in self.users.find({"is_admin": True}, {"username": 1})]
+
     def update_user(self, username: str, update_data: Dict[str, Any]) -> Tuple[bool, str]:
         """Update user information"""
         try:
@@ -226,42 +366,57 @@ class DatabaseHandler:
             print(f"Error updating user: {str(e)}")
             return False, f"Error updating user: {str(e)}"
 
-    def change_password(self, username: str, current_password: str, new_password: str) -> Tuple[bool, str]:
-        """Change user password"""
-        try:
-            user = self.users.find_one({"username": username})
-            if not user:
-                return False, "User not found"
-            
-            if not bcrypt.checkpw(current_password.encode('utf-8'), user["password"]):
-                return False, "Current password is incorrect"
-            
-            # Hash new password
-            hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-            
-            # Update password
-            result = self.users.update_one(
-                {"username": username},
-                {"$set": {"password": hashed_password}}
-            )
-            
-            if result.modified_count == 0:
-                return False, "Failed to update password"
-            
-            return True, "Password updated successfully"
-        except Exception as e:
-            print(f"Error changing password: {str(e)}")
-            return False, f"Error changing password: {str(e)}"
+    def revoke_tokens(self, username: str) -> float:
+        """Invalidate every token issued to username so far and return the first valid issue time.
+
+        The cutoff and token iat claims are fractional seconds, so a token
+        issued right after this, e.g. on logging in again, is still accepted.
+        """
+        valid_after = time.time()
+        self.users.update_one({"username": username}, {"$set": {"tokens_valid_after": valid_after}})
+        return valid_after
+
+    def get_token_revocations(self, since: float) -> Dict[str, float]:
+        """Users whose tokens were revoked at or after since, mapped to the revocation time"""
+        revoked = self.users.find(
+            {"tokens_valid_after": {"$gte": since}},
+            {"_id": 0, "username": 1, "tokens_valid_after": 1}
+        )
+        return {doc["username"]: doc["tokens_valid_after"] for doc in revoked}
 
-    def get_user_data(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user's telecom data"""
+    def get_user_data(self, user_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """Get user's telecom data, served from the cache when fresh.
+
+        With fields, only those and user_id are read from MongoDB. The cache
+        remembers which fields an entry holds, so the result can include more
+        than was asked for, and a later request for other fields reads them
+        together with those already cached.
+        """
+        wanted = None if fields is None else frozenset(fields) | {"user_id"}
+        cached = self.user_data_cache.get(user_id)
+        if cached is not None:
+            doc, covered = cached
+            if covered is None or (wanted is not None and wanted <= covered):
+                return copy.deepcopy(doc)
+            if wanted is not None:
+                wanted |= covered
         try:
-            user_data = self.user_data.find_one({"user_id": user_id})
-            return self._serialize_doc(user_data)
+            projection = None
+            if wanted is not None:
+                # Dotted and $-prefixed names are projection operators, not top-level fields
+                projection = {field: 1 for field in wanted if "." not in field and not field.startswith("$")}
+            user_data = self._serialize_doc(self.user_data.find_one({"user_id": user_id}, projection))
+            if user_data is not None:
+                self.user_data_cache.set(user_id, (copy.deepcopy(user_data), wanted))
+            return user_data
         except Exception as e:
             print(f"Error getting user data: {str(e)}")
             return None
 
+    def invalidate_user_data(self, user_id: str):
+        """Drop the cached user_data of a user after it changes"""
+        self.user_data_cache.delete(user_id)
+
     def update_user_data(self, user_id: str, update_data: Dict[str, Any]) -> bool:
         """Update user's telecom data"""
         try:
@@ -270,6 +425,7 @@ class DatabaseHandler:
                 {"user_id": user_id},
                 {"$set": update_data}
             )
+            self.invalidate_user_data(user_id)
             return result.modified_count > 0
         except Exception as e:
             print(f"Error updating user data: {str(e)}")
@@ -306,34 +462,54 @@ class DatabaseHandler:
     def get_intent_by_keyword(self, keyword: str, threshold: int = 80) -> str:
         """Get intent name based on keyword using fuzzy matching"""
         # First try exact match
-        keyword_doc = self.keyword.find_one({"keyword": keyword.lower()})
-        if keyword_doc:
-            return keyword_doc.get("intent_name")
+        intent = self.keyword_matcher.exact.get(keyword.lower())
+        if intent:
+            return intent
         
-        # If no exact match, try fuzzy matching
-        best_match = process.extractOne(keyword.lower(), [k[0] for k in self.keyword_cache])
-        if best_match and best_match[1] >= threshold:
-            # Find the intent for the matched keyword
-            for k, intent in self.keyword_cache:
-                if k == best_match[0]:
-                    return intent
+        # If no exact match, try fuzzy matching over the indexed candidates
+        best_match = self.keyword_matcher.search(keyword, limit=1, min_score=threshold)
+        if best_match:
+            return best_match[0][1]
         
         return None
 
     def get_fuzzy_suggestions(self, keyword: str, limit: int = 3) -> list:
         """Get similar keywords as suggestions"""
-        matches = process.extract(keyword.lower(), [k[0] for k in self.keyword_cache], limit=limit)
-        return [match[0] for match in matches if match[1] >= 60]
+        return [match[0] for match in self.keyword_matcher.search(keyword, limit=limit, min_score=60)]
+
+    def conversation_doc(self, user_id: str, user_message: str, bot_response: str) -> Dict[str, Any]:
+        """Build a compact chat_history record, timestamped now.
+
+        This is the only shape written to chat_history; get_chat_history
+        maps it back to readable field names.
+        """
+        return {
+            "v": CHAT_RECORD_VERSION,
+            "u": user_id,
+            "m": user_message,
+            "r": bot_response,
+            "ts": datetime.utcnow()
+        }
 
     def save_conversation(self, user_id: str, user_message: str, bot_response: str):
         """Save a conversation to chat_history"""
-        conversation = {
-            "user_id": user_id,
-            "user_message": user_message,
-            "bot_response": bot_response,
-            "timestamp": datetime.utcnow()
-        }
-        self.chat_history.insert_one(conversation)
+        self.chat_history.insert_one(self.conversation_doc(user_id, user_message, bot_response))
+
+    def insert_conversations(self, conversations: list, ordered: bool = True) -> int:
+        """Insert a batch of chat_history records and return how many were written.
+
+        An ordered insert stops at the first failing record; an unordered one
+        lets the server write the rest of the batch.
+        """
+        try:
+            result = self.chat_history.insert_many(conversations, ordered=ordered)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            print(f"Error saving conversations: {str(e)}")
+            return e.details.get("nInserted", 0)
+        except Exception as e:
+            print(f"Error saving conversations: {str(e)}")
+            return 0
 
     def get_response_by_intent(self, intent_name: str) -> str:
         """Get response template based on intent"""
@@ -342,6 +518,29 @@ class DatabaseHandler:
             return response_doc.get("response_template")
         return None
 
+    def get_response_template(self, intent_name: str) -> Optional[ResponseTemplate]:
+        """Compiled response template of an intent, or None if it has none"""
+        template = self.response_templates.get(intent_name)
+        if template is None:
+            template = self._compile_response_template(intent_name, self.get_response_by_intent(intent_name))
+        return template or None
+
+    def _compile_response_template(self, intent_name: str, source: Optional[str]):
+        # False caches the absence of a template, so unknown intents are not looked up every time
+        template = ResponseTemplate(source) if source else False
+        if template:
+            self.response_template_fields |= template.fields
+        self.response_templates.set(intent_name, template)
+        return template
+
+    def _cache_response_templates(self):
+        """Compile every response template, so the fields they use are known before the first chat"""
+        try:
+            for doc in self.response.find({}, {"intent_name": 1, "response_template": 1}):
+                self._compile_response_template(doc["intent_name"], doc.get("response_template"))
+        except Exception as e:
+            print(f"Error caching response templates: {str(e)}")
+
     def get_all_keywords(self) -> list:
         """Get all keywords from keyword collection"""
         return [doc["keyword"] for doc in self.keyword.find()]
@@ -350,21 +549,84 @@ class DatabaseHandler:
         """Get all intents from intent collection"""
         return [doc["intent_name"] for doc in self.intent.find()]
 
+    def get_response_intents(self) -> list:
+        """Names of the intents that have a response template"""
+        return self.response.distinct("intent_name")
+
     def get_all_responses(self) -> list:
         """Get all responses from response collection"""
         return [doc["response_template"] for doc in self.response.find()]
 
     def get_chat_history(self, user_id: str, limit: int = 50) -> list:
         """Get user's chat history"""
+        history, _ = self.get_chat_history_page(user_id, limit)
+        return history
+
+    def get_chat_history_page(self, user_id: str, limit: int = 50,
+                              cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+        """Get one page of chat history, newest first, and the cursor of the next page.
+
+        Pages are found by seeking on the (u, ts, _id) index from the last
+        record of the previous page, so every page costs the same however
+        far back it is. Raises ValueError for a malformed cursor.
+        """
+        query = {"u": user_id}
+        if cursor:
+            ts, last_id = decode_history_cursor(cursor)
+            query["$or"] = [{"ts": {"$lt": ts}}, {"ts": ts, "_id": {"$lt": last_id}}]
         try:
-            history = list(self.chat_history.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(limit))
-            return [self._serialize_doc(doc) for doc in history]
+            records = list(self.chat_history.find(
+                query,
+                {"m": 1, "r": 1, "ts": 1}
+            ).sort([("ts", -1), ("_id", -1)]).limit(limit + 1))
         except Exception as e:
             print(f"Error getting chat history: {str(e)}")
-            return []
+            return [], None
+
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = encode_history_cursor(records[-1]["ts"], records[-1]["_id"])
+        return [self._conversation_from_record(doc) for doc in records], next_cursor
+
+    @staticmethod
+    def _conversation_from_record(doc: Dict) -> Dict[str, Any]:
+        """Expand a compact chat_history record into the API's field names"""
+        return {
+            "_id": str(doc["_id"]),
+            "user_message": doc.get("m"),
+            "bot_response": doc.get("r"),
+            "timestamp": doc.get("ts")
+        }
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Connection pool utilization of this handler's client"""
+        return self.pool_metrics.stats()
 
     def close(self):
         """Close database connection"""
-        self.client.close() 
\ No newline at end of file
+        self.client.close()
+
+
+_shared_db: Optional[DatabaseHandler] = None
+_shared_db_lock = threading.Lock()
+
+
+def get_database() -> DatabaseHandler:
+    """Process-wide DatabaseHandler shared by the routes, auth and the chatbot"""
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                _shared_db = DatabaseHandler()
+    return _shared_db
+
+
+def close_database():
+    """Close the shared handler so the next get_database() reconnects"""
+    global _shared_db
+    with _shared_db_lock:
+        if _shared_db is not None:
+            _shared_db.close()
+            _shared_db = None
+ 
\ No newline at end of file
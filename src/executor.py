@@ -0,0 +1,26 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+# Upper bound on threads running blocking work (pymongo calls, CPU-heavy
+# matching) on behalf of async routes
+BLOCKING_POOL_SIZE = int(os.getenv('BLOCKING_POOL_SIZE', '32'))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="blocking")
+
+
+async def run_blocking(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking call on the bounded pool without stalling the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context variables over to the worker thread
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_executor, call)
+
+
+def shutdown_executor(wait: bool = True):
+    """Stop the blocking pool, waiting for queued work by default"""
+    _executor.shutdown(wait=wait)
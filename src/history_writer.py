@@ -0,0 +1,101 @@
+import asyncio
+import os
+from typing import List, Optional
+from executor import run_blocking
+
+HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'true').lower() == 'true'
+HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '200'))
+HISTORY_FLUSH_INTERVAL_MS = int(os.getenv('HISTORY_FLUSH_INTERVAL_MS', '100'))
+HISTORY_QUEUE_MAX = int(os.getenv('HISTORY_QUEUE_MAX', '10000'))
+HISTORY_UNORDERED_WRITES = os.getenv('HISTORY_UNORDERED_WRITES', 'false').lower() == 'true'
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Write-behind buffer for chat_history records.
+
+    Routes hand conversations to submit() and return without waiting for
+    MongoDB. A background task writes them with one insert_many per batch,
+    sent once batch_size records are waiting or flush_interval_ms after the
+    first one arrived. The queue is bounded: when it is full, submit() waits
+    for room, so a slow database pushes back on callers instead of growing
+    memory. close() drains everything still queued.
+    """
+
+    def __init__(self, db, batch_size: int = HISTORY_BATCH_SIZE,
+                 flush_interval_ms: int = HISTORY_FLUSH_INTERVAL_MS,
+                 max_queue: int = HISTORY_QUEUE_MAX, ordered: bool = not HISTORY_UNORDERED_WRITES,
+                 enabled: bool = HISTORY_WRITE_BEHIND):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.ordered = ordered
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, user_id: str, user_message: str, bot_response: str):
+        """Queue a conversation for writing, waiting only while the queue is full"""
+        if not self.enabled:
+            await run_blocking(self.db.save_conversation, user_id, user_message, bot_response)
+            return
+        self.start()
+        await self._queue.put(self.db.conversation_doc(user_id, user_message, bot_response))
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            # Give a burst time to accumulate unless a full batch is already waiting
+            if self._queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.flush_interval)
+            batch = [first]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                doc = self._queue.get_nowait()
+                if doc is _STOP:
+                    stopping = True
+                    break
+                batch.append(doc)
+            await self._write(batch)
+
+    async def _write(self, batch: List[dict]):
+        self.batches += 1
+        inserted = await run_blocking(self.db.insert_conversations, batch, self.ordered)
+        self.written += inserted
+        self.failed += len(batch) - inserted
+
+    async def close(self):
+        """Flush every queued record and stop the background task"""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "max_queued": self.max_depth,
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches
+        }
@@ -0,0 +1,80 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+from circuit_breaker import CircuitBreaker
+
+LLM_BATCH_ENABLED = os.getenv('LLM_BATCH_ENABLED', 'false').lower() == 'true'
+LLM_BATCH_MAX_SIZE = int(os.getenv('LLM_BATCH_MAX_SIZE', '8'))
+LLM_BATCH_MAX_WAIT_MS = int(os.getenv('LLM_BATCH_MAX_WAIT_MS', '20'))
+
+
+class IntentBatcher:
+    """Groups concurrent intent classifications into one OpenAI request.
+
+    A batch is sent once max_size messages are waiting or max_wait_ms after
+    the first one arrived, whichever comes first. Each caller gets back the
+    result for its own message.
+
+    With a breaker, each batch's outcome is recorded once, however many
+    callers are waiting on it, so callers must not record it themselves.
+    """
+
+    def __init__(self, classify_batch: Callable[[List[str]], Awaitable[List[dict]]],
+                 max_size: int = LLM_BATCH_MAX_SIZE, max_wait_ms: int = LLM_BATCH_MAX_WAIT_MS,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.classify_batch = classify_batch
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000
+        self.breaker = breaker
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Batches being sent; the event loop only keeps weak references to tasks
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_messages = 0
+
+    async def classify(self, message: str) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.batches += 1
+        self.batched_messages += len(batch)
+        try:
+            results = await self.classify_batch([message for message, _ in batch])
+        except Exception as e:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if self.breaker is not None:
+            self.breaker.record_success()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "messages": self.batched_messages,
+            "pending": len(self._pending),
+            "in_flight": len(self._tasks)
+        }
@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from cache import LRUCache
+from executor import run_blocking
+
+INTENT_CACHE_MAX_SIZE = int(os.getenv('INTENT_CACHE_MAX_SIZE', '10000'))
+INTENT_CACHE_TTL_SECONDS = int(os.getenv('INTENT_CACHE_TTL_SECONDS', '86400'))
+INTENT_CACHE_PERSIST = os.getenv('INTENT_CACHE_PERSIST', 'false').lower() == 'true'
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variations share a key"""
+    return " ".join(re.sub(r"[^\w\s]", " ", message.lower()).split())
+
+
+def is_intent_analysis(analysis) -> bool:
+    """Whether an OpenAI reply can be answered from: a dict naming its intent"""
+    return isinstance(analysis, dict) and isinstance(analysis.get("intent"), str)
+
+
+class IntentCache:
+    """Two-tier cache of OpenAI intent analyses.
+
+    Entries are keyed on the normalized message plus a fingerprint of the
+    prompt, model and rules version, so changing any of those invalidates
+    earlier results. The in-memory LRU tier is always on; the MongoDB tier
+    shares results across workers and restarts when enabled.
+    """
+
+    def __init__(self, fingerprint: str, db=None, max_size: int = INTENT_CACHE_MAX_SIZE,
+                 ttl: int = INTENT_CACHE_TTL_SECONDS, persist: bool = INTENT_CACHE_PERSIST):
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.memory = LRUCache(max_size=max_size, ttl=ttl)
+        self.collection = None
+        if persist and db is not None:
+            # Expired entries are removed by the TTL index on expires_at (migration 5)
+            self.collection = db.db['intent_cache']
+        self._stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def persistent(self) -> bool:
+        return self.collection is not None
+
+    def key(self, message: str) -> str:
+        return hashlib.sha256(f"{self.fingerprint}\0{normalize_message(message)}".encode('utf-8')).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, message: str) -> Optional[dict]:
+        """Return a cached analysis for message, or None on a miss"""
+        key = self.key(message)
+        analysis = self.memory.get(key)
+        if analysis is not None:
+            self._count("memory_hits")
+            return copy.deepcopy(analysis)
+
+        if self.persistent:
+            try:
+                doc = self.collection.find_one({"_id": key}, {"analysis": 1})
+                if doc and is_intent_analysis(doc.get("analysis")):
+                    self.memory.set(key, doc["analysis"])
+                    self._count("persistent_hits")
+                    return copy.deepcopy(doc["analysis"])
+            except Exception as e:
+                print(f"Error reading intent cache: {str(e)}")
+
+        self._count("misses")
+        return None
+
+    def set(self, message: str, analysis: dict):
+        """Store a successful analysis in every enabled tier; malformed ones are never stored"""
+        if not is_intent_analysis(analysis):
+            return
+        key = self.key(message)
+        self.memory.set(key, copy.deepcopy(analysis))
+        self._count("stores")
+        if self.persistent:
+            try:
+                self.collection.update_one(
+                    {"_id": key},
+                    {"$set": {
+                        "analysis": analysis,
+                        "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                print(f"Error writing intent cache: {str(e)}")
+
+    async def get_async(self, message: str) -> Optional[dict]:
+        """get() that only leaves the event loop for the MongoDB tier"""
+        if not self.persistent:
+            return self.get(message)
+        return await run_blocking(self.get, message)
+
+    async def set_async(self, message: str, analysis: dict):
+        """set() that only leaves the event loop for the MongoDB tier"""
+        if not self.persistent:
+            return self.set(message, analysis)
+        return await run_blocking(self.set, message, analysis)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = len(self.memory)
+        return stats
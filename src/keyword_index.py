@@ -0,0 +1,274 @@
+import heapq
+import string
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+import tracing
+
+# Number of n-gram-ranked candidates handed to the fuzzy scorers. WRatio is
+# several times dearer than a plain ratio, so free-text search scores fewer.
+MAX_FUZZY_CANDIDATES = 100
+SEARCH_CANDIDATES = 24
+
+# Common misspellings and phonetic variations
+PHONETIC_VARIATIONS = {
+    'pay': ['pai', 'pae', 'pey', 'paiy'],
+    'bill': ['bil', 'bll', 'bile'],
+    'account': ['acount', 'acct', 'accnt'],
+    'support': ['suport', 'soport', 'supprt'],
+    'data': ['date', 'dta', 'dtaa'],
+    'plan': ['pln', 'plann', 'plane'],
+    'service': ['servis', 'servce', 'srvice'],
+    'payment': ['paymnt', 'paymet', 'pament'],
+    'balance': ['balnce', 'balanc', 'balence'],
+    'usage': ['usge', 'usag', 'usgae']
+}
+
+
+class KeywordMatch(NamedTuple):
+    intent: str
+    keyword: str
+    score: int
+    path: str  # "phrase", "exact", "phonetic" or "fuzzy"
+
+
+def _sorted_tokens(text: str) -> str:
+    """Same normalisation fuzz.token_sort_ratio applies before scoring"""
+    return " ".join(sorted(utils.full_process(text, force_ascii=True).split()))
+
+
+class _Entry:
+    """A keyword with the precomputed data needed to prune fuzzy candidates"""
+    __slots__ = ("keyword", "intent", "chars", "sorted_text", "sorted_chars")
+
+    def __init__(self, keyword: str, intent: str):
+        self.keyword = keyword
+        self.intent = intent
+        self.chars = Counter(keyword)
+        self.sorted_text = _sorted_tokens(keyword)
+        self.sorted_chars = Counter(self.sorted_text)
+
+
+def _overlap(a: Counter, b: Counter) -> int:
+    return sum((a & b).values())
+
+
+def ngrams(text: str, n: int = 3) -> set:
+    """Character n-grams of text, with each word padded by spaces"""
+    padded = f" {' '.join(text.split())} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)} - {" " * n}
+
+
+class FuzzyIndex:
+    """Character n-gram inverted index over a keyword vocabulary.
+
+    Lookups only score keywords that share trigrams with the query, ranked
+    by how much of the shorter string's trigrams they share, instead of
+    scoring the whole vocabulary. Short or heavily misspelled queries ("py",
+    "uvsage") share too few trigrams with their keyword, so when trigrams
+    yield fewer than MIN_TRIGRAM_CANDIDATES keywords the bigram index is
+    used instead.
+    """
+
+    MIN_TRIGRAM_CANDIDATES = 8
+
+    def __init__(self, keywords: Iterable[str], max_candidates: int = MAX_FUZZY_CANDIDATES):
+        self.keywords: List[str] = []
+        self.processed: List[str] = []
+        self.max_candidates = max_candidates
+        # n -> (postings, per-keyword gram counts)
+        self._tables = {n: (defaultdict(list), []) for n in (2, 3)}
+
+        for keyword in keywords:
+            processed = utils.full_process(keyword)
+            keyword_id = len(self.keywords)
+            self.keywords.append(keyword)
+            self.processed.append(processed)
+            for n, (postings, gram_counts) in self._tables.items():
+                grams = ngrams(processed, n)
+                gram_counts.append(len(grams))
+                for gram in grams:
+                    postings[gram].append(keyword_id)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def candidates(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """Ids of the keywords sharing the most n-grams with query, in vocabulary order"""
+        processed = utils.full_process(query)
+        shared, query_count, gram_counts = self._count_shared(processed, 3)
+        if len(shared) < self.MIN_TRIGRAM_CANDIDATES:
+            shared, query_count, gram_counts = self._count_shared(processed, 2)
+
+        limit = limit or self.max_candidates
+        if len(shared) > limit:
+            ranked = heapq.nlargest(
+                limit, shared.items(),
+                key=lambda item: (item[1] / min(query_count, gram_counts[item[0]]), item[1], -item[0])
+            )
+            return sorted(keyword_id for keyword_id, _ in ranked)
+        return sorted(shared)
+
+    def _count_shared(self, processed: str, n: int) -> Tuple[Counter, int, List[int]]:
+        """Number of n-grams each keyword shares with an already processed query"""
+        postings, gram_counts = self._tables[n]
+        grams = ngrams(processed, n)
+        shared = Counter()
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids:
+                shared.update(ids)
+        return shared, len(grams), gram_counts
+
+    def search(self, query: str, limit: int = 1, min_score: int = 0,
+               scorer: Callable[[str, str], int] = fuzz.WRatio,
+               candidates: int = SEARCH_CANDIDATES) -> List[Tuple[str, int]]:
+        """Top keywords for query scoring at least min_score, best first"""
+        processed = utils.full_process(query)
+        if not processed:
+            return []
+        scored = []
+        for keyword_id in self.candidates(processed, max(candidates, limit)):
+            score = scorer(processed, self.processed[keyword_id])
+            if score >= min_score:
+                scored.append((score, -keyword_id))
+        best = heapq.nlargest(limit, scored)
+        return [(self.keywords[-neg_id], score) for score, neg_id in best]
+
+
+class KeywordMatcher:
+    """Keyword vocabulary compiled for per-message intent matching.
+
+    Matching resolves, in order: multi-word phrases, exact words, known
+    phonetic misspellings and finally fuzzy scoring. Fuzzy scoring uses the
+    same scorers and thresholds as before, but only over the candidates
+    returned by the n-gram index, skipping those whose character overlap
+    with the word makes the threshold unreachable.
+    """
+
+    def __init__(self, pairs: Iterable[Tuple[str, str]]):
+        self.exact: Dict[str, str] = {}
+        self.phrases: Dict[str, dict] = {}
+        self.phonetic: Dict[str, Tuple[str, str]] = {}
+        self.entries: List[_Entry] = []
+
+        for keyword, intent in pairs:
+            keyword = keyword.lower()
+            self.exact.setdefault(keyword, intent)
+            self.entries.append(_Entry(keyword, intent))
+            tokens = keyword.split()
+            if len(tokens) > 1:
+                node = self.phrases
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(None, (keyword, intent))
+
+        # A misspelling resolves to the first keyword containing the corrected word
+        for correct_word, variations in PHONETIC_VARIATIONS.items():
+            target = next((e for e in self.entries if correct_word in e.keyword), None)
+            if target:
+                for variation in variations:
+                    self.phonetic.setdefault(variation, (target.keyword, target.intent))
+
+        self.index = FuzzyIndex(e.keyword for e in self.entries)
+        self._best_fuzzy = lru_cache(maxsize=4096)(self._score_word)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def tokenize(message: str) -> List[str]:
+        words = (word.strip(string.punctuation) for word in message.lower().split())
+        return [word for word in words if word]
+
+    def search(self, query: str, limit: int = 1, min_score: int = 0) -> List[Tuple[str, str, int]]:
+        """Top (keyword, intent, score) fuzzy matches for free text"""
+        with tracing.span("fuzzy_search", {"query.length": len(query)}) as span:
+            matches = [(keyword, self.exact[keyword], score)
+                       for keyword, score in self.index.search(query.lower(), limit, min_score)]
+            if span is not None and matches:
+                span.set_attribute("keyword.matched", matches[0][0])
+                span.set_attribute("keyword.score", matches[0][2])
+            return matches
+
+    def match(self, message: str) -> Optional[KeywordMatch]:
+        """Return the best keyword match for a message, or None"""
+        words = self.tokenize(message)
+        if not words:
+            return None
+
+        phrase = self.match_phrase(words)
+        if phrase:
+            return phrase
+
+        for word in words:
+            intent = self.exact.get(word)
+            if intent:
+                return KeywordMatch(intent, word, 100, "exact")
+            if word in self.phonetic:
+                keyword, intent = self.phonetic[word]
+                return KeywordMatch(intent, keyword, 100, "phonetic")
+
+        best = None
+        for word in words:
+            candidate = self._best_fuzzy(word)
+            if candidate and (best is None or candidate.score > best.score):
+                best = candidate
+        return best
+
+    def match_phrase(self, words: List[str]) -> Optional[KeywordMatch]:
+        """Find the leftmost, longest multi-word keyword in the token list"""
+        for start in range(len(words)):
+            node = self.phrases
+            found = None
+            for word in words[start:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                found = node.get(None, found)
+            if found:
+                keyword, intent = found
+                return KeywordMatch(intent, keyword, 100, "phrase")
+        return None
+
+    def _score_word(self, word: str) -> Optional[KeywordMatch]:
+        """Best fuzzy keyword for a single word, or None below the threshold"""
+        with tracing.span("fuzzy_word", {"word.length": len(word)}) as span:
+            best = self._score_candidates(word)
+            if span is not None and best is not None:
+                span.set_attribute("keyword.matched", best.keyword)
+                span.set_attribute("keyword.score", best.score)
+            return best
+
+    def _score_candidates(self, word: str) -> Optional[KeywordMatch]:
+        threshold = 80 if len(word) > 3 else 70
+        # fuzzywuzzy rounds its scores, so anything from threshold - 0.5 may still pass
+        need = (threshold - 0.5) / 100
+        word_chars = Counter(word)
+        word_sorted = _sorted_tokens(word)
+        word_sorted_chars = Counter(word_sorted)
+
+        best = None
+        best_score = 0
+        for keyword_id in self.index.candidates(word):
+            entry = self.entries[keyword_id]
+            # Upper bounds on each scorer from the characters the strings share
+            overlap = _overlap(word_chars, entry.chars)
+            total = len(word) + len(entry.keyword)
+            shorter = min(len(word), len(entry.keyword))
+            score = 0
+            if 2 * overlap >= need * total:
+                score = fuzz.ratio(word, entry.keyword)
+            if 2 * overlap >= need * (shorter + overlap):
+                score = max(score, fuzz.partial_ratio(word, entry.keyword))
+            if word_sorted and entry.sorted_text:
+                sorted_overlap = _overlap(word_sorted_chars, entry.sorted_chars)
+                if 2 * sorted_overlap >= need * (len(word_sorted) + len(entry.sorted_text)):
+                    score = max(score, fuzz.ratio(word_sorted, entry.sorted_text))
+
+            if score > best_score and score >= threshold:
+                best_score = score
+                best = KeywordMatch(entry.intent, entry.keyword, score, "fuzzy")
+        return best
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
@@ -9,14 +9,25 @@ from datetime import datetime, timedelta
 from typing import Optional
 from pydantic import BaseModel
 import os
+import json
 from dotenv import load_dotenv
-from database import DatabaseHandler
+from database import DatabaseHandler, get_database, close_database
+from async_database import AsyncDatabaseHandler
+from executor import run_blocking, shutdown_executor
+from history_writer import HistoryWriter
+from password_hasher import hasher, PasswordHasherBusy
+import metrics
+import tracing
+from profiler import profile_async, install_signal_handler, ProfilerBusy, PROFILE_SIGNAL_ENABLED
 from auth import (
-    verify_password, get_password_hash, create_access_token,
-    get_current_user, get_current_active_user, register_user,
-    login_user, get_user_profile, update_user_profile, change_password
+    create_access_token,
+    get_current_user, get_current_active_user, get_current_admin_user, register_user,
+    login_user, get_user_profile, update_user_profile, change_password, deactivate_user,
+    principals
 )
 from chatbot import TelecomChatbot as Chatbot
+from chatbot_rules import MENU_STRUCTURE
+from menu_machine import MenuMachine
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +44,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Routes whose stages are recorded for /metrics and traced
+METRICS_ROUTES = {"/chat", "/chat/stream"}
+
+class ChatMetricsMiddleware:
+    """Time and trace chat requests end to end, from token decoding to the last streamed byte"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in METRICS_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        traceparent = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"traceparent"), None)
+        root = tracing.tracer.start_trace(f"{scope['method']} {scope['path']}",
+                                          {"http.method": scope["method"], "http.route": scope["path"]}, traceparent)
+        with metrics.timed_request(scope["path"]) as timer, root as span:
+            if span is not None:
+                send = self._recording_status(send, span)
+            if timer is not None and metrics.RESOLUTION_PATH_HEADER:
+                send = self._adding_path(send, timer)
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    def _adding_path(send, timer):
+        async def send_with_path(message):
+            if message["type"] == "http.response.start":
+                # Streamed responses start before the message is resolved and report "unresolved"
+                path = (timer.path or metrics.UNRESOLVED).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"x-resolution-path", path)]}
+            await send(message)
+        return send_with_path
+
+    @staticmethod
+    def _recording_status(send, span):
+        async def send_and_record(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+        return send_and_record
+
+app.add_middleware(ChatMetricsMiddleware)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
@@ -40,12 +94,24 @@ app.mount("/static", StaticFiles(directory="src/static"), name="static")
 templates = Jinja2Templates(directory="src/templates")
 
 # Initialize database and chatbot
-db = DatabaseHandler()
-chatbot = Chatbot()
+db = get_database()
+async_db = AsyncDatabaseHandler(db)
+chatbot = Chatbot(db)
+metrics.register_breaker("llm_breaker", chatbot.llm_breaker)
+# Buffers chat_history writes so responses never wait on them
+history_writer = HistoryWriter(db)
+
+# Largest page /chat/history will return
+HISTORY_PAGE_MAX = int(os.getenv('HISTORY_PAGE_MAX', '100'))
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    """Shed login bursts instead of letting them queue without bound"""
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Pydantic models
 class ChatMessage(BaseModel):
     message: str
@@ -58,7 +124,7 @@ async def read_root():
 @app.post("/register")
 async def register(form_data: OAuth2PasswordRequestForm = Depends()):
     """Register a new user"""
-    success, message = register_user(form_data.username, form_data.username, form_data.password)
+    success, message = await register_user(form_data.username, form_data.username, form_data.password)
     if not success:
         raise HTTPException(status_code=400, detail=message)
     return {"message": message}
@@ -66,7 +132,7 @@ async def register(form_data: OAuth2PasswordRequestForm = Depends()):
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login user and return access token"""
-    success, message, data = login_user(form_data.username, form_data.password)
+    success, message, data = await login_user(form_data.username, form_data.password)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -83,7 +149,7 @@ async def read_users_me(current_user = Depends(get_current_active_user)):
 @app.get("/users/me/profile")
 async def get_profile(current_user = Depends(get_current_active_user)):
     """Get user profile with telecom data"""
-    profile = get_user_profile(current_user["username"])
+    profile = await run_blocking(get_user_profile, current_user["username"])
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     return profile
@@ -94,7 +160,7 @@ async def update_profile(
     current_user = Depends(get_current_active_user)
 ):
     """Update user profile"""
-    success, message = update_user_profile(current_user["username"], update_data)
+    success, message = await run_blocking(update_user_profile, current_user["username"], update_data)
     if not success:
         raise HTTPException(status_code=400, detail=message)
     return {"message": message}
@@ -106,7 +172,7 @@ async def update_password(
     current_user = Depends(get_current_active_user)
 ):
     """Change user password"""
-    success, message = change_password(
+    success, message = await change_password(
         current_user["username"],
         current_password,
         new_password
@@ -123,38 +189,157 @@ async def chat(
     """Process chat message and return response"""
     try:
         # Get user's telecom data
-        user_data = db.get_user_data(current_user["_id"])
+        with metrics.stage("user_data"):
+            user_data = await async_db.get_user_data(current_user["_id"], chatbot.user_data_fields)
         
         # Get chatbot response
-        response = chatbot.get_response(chat_message.message, user_data)
+        response = await chatbot.get_response_async(chat_message.message, user_data, str(current_user["_id"]))
         
-        # Save conversation
-        db.save_conversation(
-            str(current_user["_id"]),
-            chat_message.message,
-            response
-        )
+        # Queue the conversation for a batched write
+        with metrics.stage("history_submit"):
+            await history_writer.submit(
+                str(current_user["_id"]),
+                chat_message.message,
+                response
+            )
         
         return {"response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(
+    chat_message: ChatMessage,
+    current_user = Depends(get_current_active_user)
+):
+    """Process chat message and stream the response as Server-Sent Events"""
+    with metrics.stage("user_data"):
+        user_data = await async_db.get_user_data(current_user["_id"], chatbot.user_data_fields)
+
+    async def events():
+        parts = []
+        async for event in chatbot.stream_response(chat_message.message, user_data, str(current_user["_id"])):
+            if event["type"] == "delta":
+                parts.append(event["text"])
+            yield f"event: {event['type']}\ndata: {json.dumps({'text': event['text']})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+        with metrics.stage("history_submit"):
+            await history_writer.submit(
+                str(current_user["_id"]),
+                chat_message.message,
+                "".join(parts)
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/chat/history")
 async def get_chat_history(
     current_user = Depends(get_current_active_user),
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    """Get user's chat history"""
+    """Get one page of the user's chat history, newest first.
+
+    Pass the returned next_cursor back as cursor to fetch older messages.
+    """
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
     try:
-        history = db.get_chat_history(str(current_user["_id"]), limit)
-        return {"history": history}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        history, next_cursor = await async_db.get_chat_history_page(str(current_user["_id"]), limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"history": history, "next_cursor": next_cursor}
+
+@app.post("/admin/users/{username}/deactivate")
+async def deactivate_account(
+    username: str,
+    current_user = Depends(get_current_admin_user)
+):
+    """Deactivate an account and reject the tokens it already holds"""
+    success, message = await run_blocking(deactivate_user, username)
+    if not success:
+        raise HTTPException(status_code=400, detail=message)
+    return {"message": message}
+
+# Code that resolves a message's intent, for /admin/profile?mode=intent
+INTENT_ANALYSIS = (
+    Chatbot.analyze_intent, Chatbot._match_intent, Chatbot._analyze_with_openai,
+    Chatbot._analyze_with_openai_async, DatabaseHandler.get_intent_by_keyword
+)
+
+@app.post("/admin/profile")
+async def profile_worker(
+    seconds: float = 10,
+    mode: str = "all",
+    include_idle: bool = False,
+    current_user = Depends(get_current_admin_user)
+):
+    """Sample this worker's stacks for `seconds` and return them as collapsed stacks.
+
+    The output feeds flamegraph.pl or speedscope directly. mode=intent keeps
+    only samples taken inside intent analysis.
+    """
+    if mode not in ("all", "intent"):
+        raise HTTPException(status_code=400, detail="mode must be 'all' or 'intent'")
+    try:
+        profile = await profile_async(seconds, focus=INTENT_ANALYSIS if mode == "intent" else None,
+                                      include_idle=include_idle)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(profile.collapsed(), headers={
+        "X-Profile-Seconds": f"{profile.elapsed:.3f}",
+        "X-Profile-Samples": str(profile.samples)
+    })
+
+@app.on_event("startup")
+async def startup():
+    """Start the chat history flush task and listen for profiling signals"""
+    if not db.schema_ready:
+        # Refuse to serve against a database that has not been migrated
+        raise RuntimeError("Database schema is out of date; run `python src/migrations.py`")
+    history_writer.start()
+    # Options leading to an intent with no response get a generic reply; list them once per worker
+    menu = MenuMachine(MENU_STRUCTURE, known_intents=await run_blocking(db.get_response_intents))
+    if menu.dangling:
+        print(f"Menu options without a menu or response ({len(menu.dangling)}): {'; '.join(menu.dangling)}")
+    if PROFILE_SIGNAL_ENABLED:
+        install_signal_handler()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush queued history and let in-flight blocking work finish before the worker exits"""
+    await history_writer.close()
+    hasher.shutdown()
+    shutdown_executor()
+    tracing.tracer.shutdown()
+    close_database()
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "mongo_pool": db.pool_stats(),
+        "history_writer": history_writer.stats(),
+        "principal_cache": principals.stats(),
+        "password_hasher": hasher.stats(),
+        "intent_cache": chatbot.intent_cache.stats(),
+        "semantic_cache": chatbot.semantic_cache.stats() if chatbot.semantic_cache else None,
+        "coalesced_llm_calls": chatbot.llm_flight.coalesced + chatbot.async_llm_flight.coalesced,
+        "llm_batches": chatbot.intent_batcher.stats() if chatbot.intent_batcher else None,
+        "llm_breaker": chatbot.llm_breaker.stats(),
+        "tracing": tracing.tracer.stats()
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Chat latency histograms and LLM circuit breaker state in the Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     import uvicorn
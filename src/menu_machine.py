@@ -0,0 +1,116 @@
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+
+ROOT = "main_menu"
+BACK_HINT = "\nOr type 'back' to return to the previous menu."
+
+
+class MenuStructureError(ValueError):
+    """Raised when a menu structure cannot be compiled"""
+
+
+class MenuTransition(NamedTuple):
+    target: str
+    # Options leading back to the root menu clear the navigation history
+    resets_history: bool
+
+
+class MenuMachine:
+    """A menu structure compiled into immutable lookup tables.
+
+    Each menu is a state. transitions[state][digit] is the option picked
+    by that digit, or None, and every menu body is rendered once here, so
+    a menu turn is a couple of tuple lookups and one string join. The
+    structure is checked while compiling: a missing root, options that are
+    not positive integers, options without text or intent and menus that
+    cannot be reached from the root raise MenuStructureError. Given the
+    intents that have a response, options leading to neither a menu nor
+    one of them are listed in dangling.
+    """
+
+    def __init__(self, structure: Mapping[str, dict], root: str = ROOT,
+                 known_intents: Optional[Iterable[str]] = None):
+        if root not in structure:
+            raise MenuStructureError(f"Menu structure has no '{root}' menu")
+        self.root = root
+        self.states: Tuple[str, ...] = tuple(structure)
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.states)}
+
+        transitions = []
+        heads = []
+        bodies = []
+        for name in self.states:
+            menu = structure[name]
+            options = sorted(self._options(name, menu).items())
+            row = [None] * (options[-1][0] + 1 if options else 0)
+            for digit, option in options:
+                row[digit] = MenuTransition(option["intent"], option["intent"] == root)
+            transitions.append(tuple(row))
+            heads.append(f"{menu.get('title', name)}\n\n")
+            bodies.append("Would you like to:\n" + "".join(f"{digit}. {option['text']}\n" for digit, option in options))
+        self.transitions: Tuple[Tuple[Optional[MenuTransition], ...], ...] = tuple(transitions)
+        self._heads = tuple(heads)
+        self._bodies = tuple(bodies)
+        self.welcome = self._render_welcome(structure)
+        self._check_reachable()
+        self.dangling: List[str] = [] if known_intents is None else self._dangling(set(known_intents))
+
+    @staticmethod
+    def _options(name: str, menu: dict) -> Dict[int, dict]:
+        options = menu.get("options")
+        if not isinstance(options, dict) or not options:
+            raise MenuStructureError(f"Menu '{name}' has no options")
+        for digit, option in options.items():
+            if not isinstance(digit, int) or isinstance(digit, bool) or digit < 1:
+                raise MenuStructureError(f"Menu '{name}' option {digit!r} is not a positive integer")
+            if not option.get("text") or not option.get("intent"):
+                raise MenuStructureError(f"Menu '{name}' option {digit} needs both text and intent")
+        return options
+
+    def _render_welcome(self, structure: Mapping[str, dict]) -> str:
+        """The main menu greeting, listing each submenu's options under its entry"""
+        options = sorted(structure[self.root]["options"].items())
+        lines = ["Welcome to Telecom Support! I'm here to help you with your telecom needs. "
+                 "I follow a structured menu system to assist you effectively.\n\n"
+                 "Here's what I can help you with:"]
+        for digit, option in options:
+            lines.append(f"{digit}. {option['text']}")
+            if option["intent"] in structure:
+                lines.extend(f"   - {sub_option['text']}"
+                             for _, sub_option in sorted(structure[option["intent"]]["options"].items()))
+        lines.append(f"\nPlease select a number ({options[0][0]}-{options[-1][0]}) "
+                     "to get started with the service you need help with.")
+        return "\n".join(lines)
+
+    def __contains__(self, state: str) -> bool:
+        return state in self._index
+
+    def transition(self, state: Optional[str], digit: int) -> Optional[MenuTransition]:
+        """The option picked by digit in menu state, or None when there is no such option"""
+        index = self._index.get(state)
+        if index is None:
+            return None
+        row = self.transitions[index]
+        return row[digit] if 0 <= digit < len(row) else None
+
+    def render(self, state: str, details: str = "", show_back: bool = False) -> str:
+        """Menu state's title, optional details, its options and optionally the 'back' hint"""
+        index = self._index[state]
+        return "".join((self._heads[index], details, self._bodies[index], BACK_HINT if show_back else ""))
+
+    def _check_reachable(self):
+        reached = {self.root}
+        pending = [self.root]
+        while pending:
+            for option in self.transitions[self._index[pending.pop()]]:
+                if option and option.target in self._index and option.target not in reached:
+                    reached.add(option.target)
+                    pending.append(option.target)
+        unreachable = [state for state in self.states if state not in reached]
+        if unreachable:
+            raise MenuStructureError(f"Menus {unreachable} cannot be reached from '{self.root}'")
+
+    def _dangling(self, known: set) -> List[str]:
+        return [f"Menu '{state}' option {digit} leads to '{option.target}', which has no menu or response"
+                for state, row in zip(self.states, self.transitions)
+                for digit, option in enumerate(row)
+                if option and option.target not in self._index and option.target not in known]
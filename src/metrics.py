@@ -0,0 +1,211 @@
+import os
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import tracing
+
+# Record per-stage timings for chat requests and serve them from /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Name the resolution path in an X-Resolution-Path response header, for load tests
+RESOLUTION_PATH_HEADER = os.getenv('RESOLUTION_PATH_HEADER', 'false').lower() == 'true'
+
+# Upper bounds in seconds, from a menu lookup up to an OpenAI call that hits its budget
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How a message was answered; set by the chatbot as it resolves the message
+RESOLUTION_PATHS = ("menu", "exact", "phonetic", "fuzzy", "llm", "llm_coalesced", "llm_cache", "fallback", "error")
+UNRESOLVED = "unresolved"
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per label value tuple"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(values, list(counts), total) for values, (counts, total) in sorted(self._series.items())]
+        for values, counts, total in series:
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class CallbackMetric:
+    """A gauge or counter whose samples are read from their owner at scrape time"""
+
+    def __init__(self, name: str, help_text: str, kind: str, labels: Sequence[str],
+                 read: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self.read():
+            labels = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(self.labels, values))
+            lines.append(f"{self.name}{{{labels}}} {value!r}" if labels else f"{self.name} {value!r}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics served by /metrics"""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str],
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(histogram)
+        return histogram
+
+    def callback(self, name: str, help_text: str, kind: str, read: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+                 labels: Sequence[str] = ()) -> CallbackMetric:
+        """A gauge or counter read by calling read() -> [(label values, value)] on every scrape"""
+        metric = CallbackMetric(name, help_text, kind, labels, read)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+REQUEST_SECONDS = registry.histogram(
+    "chat_request_duration_seconds", "Chat request latency by route and resolution path", ("route", "path"))
+STAGE_SECONDS = registry.histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat request", ("stage", "path"))
+
+
+def register_breaker(name: str, breaker):
+    """Export a CircuitBreaker's state and counters as {name}_* metrics"""
+    states = (breaker.CLOSED, breaker.HALF_OPEN, breaker.OPEN)
+    registry.callback(f"{name}_state", "1 for the circuit breaker's current state, 0 for the others", "gauge",
+                      lambda: [((state,), 1 if breaker.state == state else 0) for state in states], ("state",))
+    registry.callback(f"{name}_consecutive_failures", "Failures since the last success", "gauge",
+                      lambda: [((), breaker.stats()["consecutive_failures"])])
+    for counter, help_text in (("opened", "Times the circuit opened"),
+                               ("rejected", "Calls refused while the circuit was open"),
+                               ("failures", "Failed calls"), ("successes", "Successful calls")):
+        registry.callback(f"{name}_{counter}_total", help_text, "counter",
+                          lambda counter=counter: [((), breaker.stats()[f"{counter}_total"])])
+
+
+class RequestTimer:
+    """Stage timings of one request, observed once its resolution path is known"""
+
+    __slots__ = ("route", "path", "stages", "started")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.path: Optional[str] = None
+        self.stages: List[Tuple[str, float]] = []
+        self.started = perf_counter()
+
+    def finish(self):
+        path = self.path or UNRESOLVED
+        for name, seconds in self.stages:
+            STAGE_SECONDS.observe(seconds, name, path)
+        REQUEST_SECONDS.observe(perf_counter() - self.started, self.route, path)
+
+
+# The timer of the request being handled; run_blocking carries it to worker threads
+_current: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "span", "start")
+
+    def __init__(self, timer: RequestTimer, name: str, span):
+        self.timer = timer
+        self.name = name
+        self.span = span
+
+    def __enter__(self):
+        self.span.__enter__()
+        self.start = perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.stages.append((self.name, perf_counter() - self.start))
+        return self.span.__exit__(exc_type, exc, tb)
+
+
+def stage(name: str):
+    """Time a block as one stage of the current request, and trace it as a span when the request is traced.
+
+    Free when the request is neither timed nor traced.
+    """
+    timer = _current.get()
+    span = tracing.span(name)
+    return _Stage(timer, name, span) if timer is not None else span
+
+
+def set_path(path: str):
+    """Record how the current request's message was resolved; the last call wins"""
+    timer = _current.get()
+    if timer is not None:
+        timer.path = path
+
+
+class timed_request:
+    """Time everything inside the block as one request to route"""
+
+    __slots__ = ("route", "timer", "token")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.timer = None
+        self.token = None
+
+    def __enter__(self) -> Optional[RequestTimer]:
+        if METRICS_ENABLED:
+            self.timer = RequestTimer(self.route)
+            self.token = _current.set(self.timer)
+        return self.timer
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timer is not None:
+            _current.reset(self.token)
+            if exc_type is not None and self.timer.path is None:
+                self.timer.path = "error"
+            self.timer.finish()
+        return False
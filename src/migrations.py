@@ -0,0 +1,314 @@
+"""Versioned schema setup for the chatbot database.
+
+Indexes and seed data used to be (re)created by every DatabaseHandler and
+TelecomChatbot on boot. They are now applied once, as numbered idempotent
+migrations, and the applied version is stored in the ``meta`` collection so
+a booting worker only needs a single find_one to know it is up to date.
+A worker whose database is behind refuses to start until it is migrated.
+
+Migrations hold a lock on the schema document, so concurrent runs (several
+workers with MIGRATE_ON_STARTUP=true, or a worker and this command) apply
+each migration once while the others wait.
+
+Run pending migrations with:
+
+    python src/migrations.py            # migrate to the latest version
+    python src/migrations.py --status   # print the stored and latest versions
+
+Migrations that rewrite existing documents (such as 2, which compacts
+chat_history) can take a while on large collections. They are marked
+offline and only this command applies them; MIGRATE_ON_STARTUP workers
+apply online (index and seed) migrations and stop at the first offline one.
+
+The default responses are seeded by migration 1 and re-seeded by every run
+of this command, even when the schema is up to date, and by
+setup_data/setup_all.py after it clears the response collection. The seed
+upserts by intent name and only inserts missing defaults, so it is safe to
+re-run and keeps responses that were edited since.
+"""
+import argparse
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, NamedTuple
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from session_store import SESSION_TTL_SECONDS
+
+# Apply pending migrations when a worker boots instead of only checking the
+# version. Off by default: run `python src/migrations.py` as a release step.
+MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', 'false').lower() == 'true'
+# How long a migration run may hold the schema lock before another may take
+# it over, and how long a booting worker waits for someone else's run
+MIGRATION_LOCK_SECONDS = int(os.getenv('MIGRATION_LOCK_SECONDS', '900'))
+MIGRATION_LOCK_WAIT_SECONDS = int(os.getenv('MIGRATION_LOCK_WAIT_SECONDS', '60'))
+
+SCHEMA_DOC_ID = "schema"
+
+# Legacy chat_history documents rewritten per bulk write
+HISTORY_MIGRATION_BATCH_SIZE = int(os.getenv('HISTORY_MIGRATION_BATCH_SIZE', '1000'))
+
+# Responses every deployment needs, whether or not setup_data was run
+DEFAULT_RESPONSES = {
+    "network_issues": "I understand you're experiencing network issues. Let me help you troubleshoot. First, could you please try turning your device off and on again? If the issue persists, I can help you check your signal strength and network settings.",
+    "billing_issues": "I can help you with your billing concerns. Could you please provide your account number or the last 4 digits of your phone number? This will help me access your billing information securely.",
+    "account_management": "I can help you manage your account. What specific changes would you like to make? Options include updating personal information, changing your plan, or modifying your payment method.",
+    "data_usage": "I can help you check your data usage. Would you like to know your current usage, remaining data, or would you like to purchase additional data?",
+    "plan_info": "I can provide information about our available plans. Would you like to know about our current promotions, compare plans, or get details about your current plan?",
+    "payment_issues": "I understand you're having issues with your payment. I can help you with payment processing, setting up automatic payments, or resolving any payment-related concerns.",
+    "technical_support": "I can help you with technical support. Please describe the issue you're experiencing, and I'll guide you through the troubleshooting process.",
+    "general_inquiry": "I'm here to help you with any questions about our services. What would you like to know?"
+}
+
+
+class MigrationLocked(Exception):
+    """Raised when another process holds the schema lock"""
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable
+    # Offline migrations rewrite documents and are never applied by a booting worker
+    online: bool = True
+
+
+def _create_indexes(db):
+    """Indexes previously created by every DatabaseHandler on boot"""
+    db.chat_history.create_index([("user_id", 1), ("timestamp", -1)])
+    db.intent.create_index([("intent_name", 1)], unique=True)
+    db.keyword.create_index([("keyword", 1)], unique=True)
+    db.response.create_index([("intent_name", 1)])
+    db.users.create_index([("username", 1)], unique=True)
+    db.users.create_index([("email", 1)], unique=True)
+    db.user_data.create_index("user_id", unique=True)
+    db.user_data.create_index("account_number", unique=True)
+    db.user_data.create_index("email", unique=True)
+
+
+def seed_default_responses(db):
+    """Insert whichever default responses and their intents are missing, in two bulk writes"""
+    now = datetime.utcnow()
+    db.response.bulk_write([
+        UpdateOne(
+            {"intent_name": intent_name},
+            {"$setOnInsert": {"intent_name": intent_name, "response_template": template}},
+            upsert=True
+        )
+        for intent_name, template in DEFAULT_RESPONSES.items()
+    ], ordered=False)
+    db.intent.bulk_write([
+        UpdateOne(
+            {"intent_name": intent_name},
+            {"$setOnInsert": {"intent_name": intent_name, "created_at": now}},
+            upsert=True
+        )
+        for intent_name in DEFAULT_RESPONSES
+    ], ordered=False)
+
+
+def _initial_schema(db):
+    _create_indexes(db)
+    seed_default_responses(db)
+
+
+def _compact_chat_history(db, batch_size: int = HISTORY_MIGRATION_BATCH_SIZE):
+    """Rewrite both legacy chat_history shapes into the compact v1 record.
+
+    Old documents come from store_chat_history (message/response) and
+    save_conversation (user_message/bot_response). They are streamed in
+    batches and replaced in place, keeping their _id, so the migration can
+    be interrupted and re-run.
+    """
+    db.chat_history.create_index([("u", 1), ("ts", -1)])
+    legacy = db.chat_history.find(
+        {"v": {"$exists": False}},
+        {"user_id": 1, "message": 1, "response": 1, "user_message": 1, "bot_response": 1, "timestamp": 1}
+    ).batch_size(batch_size)
+
+    batch = []
+    rewritten = 0
+    for doc in legacy:
+        batch.append(ReplaceOne({"_id": doc["_id"]}, {
+            "v": 1,
+            "u": doc.get("user_id"),
+            "m": doc.get("user_message", doc.get("message")),
+            "r": doc.get("bot_response", doc.get("response")),
+            "ts": doc.get("timestamp")
+        }))
+        if len(batch) >= batch_size:
+            rewritten += db.chat_history.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        rewritten += db.chat_history.bulk_write(batch, ordered=False).modified_count
+    print(f"Rewrote {rewritten} chat_history documents")
+
+    if "user_id_1_timestamp_-1" in db.chat_history.index_information():
+        db.chat_history.drop_index("user_id_1_timestamp_-1")
+
+
+def _history_keyset_index(db):
+    """Index the (ts, _id) keyset used by history pagination; it also covers (u, ts)"""
+    db.chat_history.create_index([("u", 1), ("ts", -1), ("_id", -1)])
+    if "u_1_ts_-1" in db.chat_history.index_information():
+        db.chat_history.drop_index("u_1_ts_-1")
+
+
+def _token_revocation_index(db):
+    """Lets workers poll recent token revocations without scanning users"""
+    db.users.create_index("tokens_valid_after", sparse=True)
+
+
+def _expiring_collection_indexes(db):
+    """TTL indexes of the session store and the persistent intent cache, previously created on every boot.
+
+    The session TTL is read from SESSION_TTL_SECONDS when this runs; changing
+    it later needs a collMod on the existing index.
+    """
+    db.db['session'].create_index("updated_at", expireAfterSeconds=SESSION_TTL_SECONDS)
+    db.db['intent_cache'].create_index("expires_at", expireAfterSeconds=0)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create indexes and seed default responses", _initial_schema),
+    Migration(2, "compact chat_history records", _compact_chat_history, online=False),
+    Migration(3, "chat_history keyset pagination index", _history_keyset_index),
+    Migration(4, "token revocation index", _token_revocation_index),
+    Migration(5, "session and intent cache TTL indexes", _expiring_collection_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(db) -> int:
+    """Version recorded by the last successful migration, 0 for a fresh database"""
+    doc = db.db['meta'].find_one({"_id": SCHEMA_DOC_ID}, {"version": 1})
+    # The lock alone can create the document before any migration has run
+    return doc.get("version", 0) if doc else 0
+
+
+def _set_schema_version(db, version: int):
+    db.db['meta'].update_one(
+        {"_id": SCHEMA_DOC_ID},
+        {"$set": {"version": version, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def _lock_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _acquire_lock(db, owner: str, lease: int = MIGRATION_LOCK_SECONDS) -> bool:
+    """Take (or extend) the schema lock unless another owner holds an unexpired lease"""
+    now = datetime.utcnow()
+    try:
+        db.db['meta'].find_one_and_update(
+            {"_id": SCHEMA_DOC_ID,
+             "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}, {"locked_by": owner}]},
+            {"$set": {"locked_by": owner, "locked_until": now + timedelta(seconds=lease)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # The schema document exists and the filter did not match it: someone else holds the lock
+        return False
+
+
+def _release_lock(db, owner: str):
+    db.db['meta'].update_one(
+        {"_id": SCHEMA_DOC_ID, "locked_by": owner},
+        {"$unset": {"locked_by": "", "locked_until": ""}}
+    )
+
+
+def migrate(db, target: int = SCHEMA_VERSION, online_only: bool = False) -> int:
+    """Apply every migration above the stored version up to target and return the new version.
+
+    With online_only, stops before the first offline migration. Raises
+    MigrationLocked if another process is migrating.
+    """
+    owner = _lock_owner()
+    if not _acquire_lock(db, owner):
+        raise MigrationLocked("Another process is applying migrations")
+    try:
+        # Read the version under the lock: whoever held it before may have migrated already
+        current = get_schema_version(db)
+        for migration in MIGRATIONS:
+            if current < migration.version <= target:
+                if online_only and not migration.online:
+                    print(f"Migration {migration.version} ({migration.description}) rewrites documents; "
+                          f"run `python src/migrations.py`")
+                    break
+                print(f"Applying migration {migration.version}: {migration.description}")
+                migration.apply(db)
+                _set_schema_version(db, migration.version)
+                current = migration.version
+                _acquire_lock(db, owner)
+        return current
+    finally:
+        _release_lock(db, owner)
+
+
+def _wait_for_migration(db, timeout: float = MIGRATION_LOCK_WAIT_SECONDS) -> int:
+    """Poll while another process migrates; returns the stored version once the lock is free or on timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        doc = db.db['meta'].find_one({"_id": SCHEMA_DOC_ID}, {"version": 1, "locked_until": 1}) or {}
+        locked_until = doc.get("locked_until")
+        if locked_until is None or locked_until < datetime.utcnow() or time.monotonic() >= deadline:
+            return doc.get("version", 0)
+        time.sleep(1)
+
+
+def ensure_schema(db, auto_migrate: bool = MIGRATE_ON_STARTUP) -> bool:
+    """Boot-time check: one read when up to date, False when the schema is behind.
+
+    With auto_migrate, pending online migrations are applied first; when
+    another worker is already applying them, this one waits for it instead.
+    """
+    try:
+        current = get_schema_version(db)
+        if current >= SCHEMA_VERSION:
+            return True
+        if auto_migrate:
+            try:
+                current = migrate(db, online_only=True)
+            except MigrationLocked:
+                current = _wait_for_migration(db)
+            if current >= SCHEMA_VERSION:
+                return True
+        print(f"Database schema is at version {current}, expected {SCHEMA_VERSION}. "
+              f"Run `python src/migrations.py`.")
+        return False
+    except Exception as e:
+        print(f"Error checking database schema: {str(e)}")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending database migrations")
+    parser.add_argument("--status", action="store_true", help="only print the stored and latest schema versions")
+    parser.add_argument("--target", type=int, default=SCHEMA_VERSION, help="migrate up to this version")
+    args = parser.parse_args()
+
+    from database import DatabaseHandler
+    db = DatabaseHandler(check_schema=False)
+    try:
+        if args.status:
+            print(f"Schema version: {get_schema_version(db)} (latest {SCHEMA_VERSION})")
+        else:
+            version = migrate(db, args.target)
+            if version >= 1:
+                # Restore defaults removed since migration 1 ran, e.g. by setup_all
+                seed_default_responses(db)
+            print(f"Schema version: {version}")
+    except MigrationLocked as e:
+        print(f"{str(e)}; try again once it has finished")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
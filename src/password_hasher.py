@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Union
+import bcrypt
+
+# bcrypt cost factor for new hashes; stored hashes with another cost are
+# rehashed the next time their owner logs in
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+# "process" keeps hashing off the interpreter running the event loop entirely;
+# "thread" avoids the worker processes where bcrypt releases the GIL
+PASSWORD_HASH_EXECUTOR = os.getenv('PASSWORD_HASH_EXECUTOR', 'process').lower()
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+# Hash/verify calls allowed to wait for a worker before new ones are refused
+PASSWORD_HASH_QUEUE_MAX = int(os.getenv('PASSWORD_HASH_QUEUE_MAX', '64'))
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash or verify calls are already waiting"""
+
+
+def _to_bytes(value: Union[str, bytes]) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _verify(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """bcrypt hashing on a bounded, dedicated worker pool.
+
+    There is deliberately no inline hash or verify: every call runs on this
+    small pool so a burst of logins queues behind at most
+    `workers` bcrypt calls instead of taking over the event loop or the
+    blocking pool used for MongoDB. Once max_queue calls are waiting, new
+    ones fail fast with PasswordHasherBusy.
+    """
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_QUEUE_MAX, executor: str = PASSWORD_HASH_EXECUTOR):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor_kind = executor
+        self._executor: Optional[Executor] = None
+        self.pending = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == 'thread':
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+            else:
+                # spawn, not fork: the parent already holds MongoDB connections and threads
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def needs_rehash(self, hashed: Union[str, bytes]) -> bool:
+        """True when hashed was made with a cost factor other than the configured one"""
+        try:
+            return int(_to_bytes(hashed).split(b"$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    async def _submit(self, func, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password checks in progress, please retry")
+        self.pending += 1
+        self.max_queued = max(self.max_queued, self.pending - self.workers)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), func, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    async def hash_async(self, password: str) -> bytes:
+        return await self._submit(_hash, _to_bytes(password), self.rounds)
+
+    async def verify_async(self, password: str, hashed: Union[str, bytes]) -> bool:
+        return await self._submit(_verify, _to_bytes(password), _to_bytes(hashed))
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "in_progress": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+hasher = PasswordHasher()
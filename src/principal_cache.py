@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from cache import LRUCache
+
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv('PRINCIPAL_CACHE_MAX_SIZE', '10000'))
+# How often a worker picks up token revocations made by other workers
+REVOCATION_POLL_SECONDS = float(os.getenv('REVOCATION_POLL_SECONDS', '5'))
+
+
+class PrincipalCache:
+    """Authenticated users keyed by token subject and expiry, plus revocations.
+
+    A cached principal is only served for the token it was loaded for and
+    never past PRINCIPAL_CACHE_TTL_SECONDS. invalidate() makes the user's
+    next request reload it; revoke() also rejects their tokens issued
+    before it. Revocations made by other workers are polled from MongoDB
+    every REVOCATION_POLL_SECONDS.
+
+    Revocations are not in an LRU: evicting one would let the tokens it
+    rejects authenticate again. Each is kept until revocation_ttl (the token
+    lifetime) has passed, however many there are.
+    """
+
+    def __init__(self, ttl: int = PRINCIPAL_CACHE_TTL_SECONDS, max_size: int = PRINCIPAL_CACHE_MAX_SIZE,
+                 revocation_ttl: Optional[int] = None, poll_interval: float = REVOCATION_POLL_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self._principals = LRUCache(max_size=max_size, ttl=ttl)
+        # username -> (valid_after, kept until); a revocation only has to outlive the tokens it rejects
+        self._revoked: Dict[str, Tuple[float, Optional[float]]] = {}
+        self._revocation_ttl = revocation_ttl
+        self._revoked_lock = threading.Lock()
+        self._next_purge = 0.0
+        self._invalidated = LRUCache(max_size=max_size, ttl=ttl)
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._last_poll: Optional[float] = None
+        self._poll_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str, exp: Any) -> Optional[Dict[str, Any]]:
+        entry = self._principals.get((username, exp))
+        if entry is None or entry[0] < self._invalidated.get(username, 0):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(entry[1])
+
+    def set(self, username: str, exp: Any, principal: Dict[str, Any]):
+        self._principals.set((username, exp), (self._clock(), dict(principal)))
+
+    def invalidate(self, username: str):
+        """Reload this user's principal on their next request"""
+        self._invalidated.set(username, self._clock())
+
+    def revoke(self, username: str, valid_after: Optional[float] = None):
+        """Reject this user's tokens issued before valid_after (default: now)"""
+        self.invalidate(username)
+        now = self._clock()
+        valid_after = now if valid_after is None else valid_after
+        keep_until = now + self._revocation_ttl if self._revocation_ttl else None
+        with self._revoked_lock:
+            current = self._revoked.get(username)
+            if current is None or valid_after > current[0]:
+                self._revoked[username] = (valid_after, keep_until)
+            if now >= self._next_purge:
+                self._purge_revocations(now)
+
+    def _purge_revocations(self, now: float):
+        """Drop revocations whose tokens have all expired; called with the lock held"""
+        expired = [name for name, (_, keep_until) in self._revoked.items()
+                   if keep_until is not None and keep_until <= now]
+        for name in expired:
+            del self._revoked[name]
+        self._next_purge = now + self.poll_interval
+
+    def is_revoked(self, username: str, issued_at: Optional[float]) -> bool:
+        entry = self._revoked.get(username)
+        return entry is not None and (issued_at is None or issued_at < entry[0])
+
+    def poll_due(self) -> bool:
+        return self._last_poll is None or self._clock() - self._last_poll >= self.poll_interval
+
+    def refresh(self, fetch_revocations: Callable[[float], Dict[str, float]]):
+        """Apply revocations recorded since the last poll; fetch_revocations(since) -> {username: valid_after}"""
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            now = self._clock()
+            if self._last_poll is not None:
+                # Overlap the previous window so a revocation written mid-poll is not missed
+                since = int(self._last_poll - self.poll_interval)
+            else:
+                # Older revocations only concern tokens that have already expired
+                since = int(now - self._revocation_ttl) if self._revocation_ttl else 0
+            for username, valid_after in fetch_revocations(since).items():
+                self.revoke(username, valid_after)
+            self._last_poll = now
+        except Exception as e:
+            print(f"Error refreshing token revocations: {str(e)}")
+        finally:
+            self._poll_lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._principals), "revoked": len(self._revoked)}
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set
+
+# Sampling interval, and the longest profile a single request may ask for
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '60'))
+# SIGUSR2 makes a worker profile itself for PROFILE_SIGNAL_SECONDS and write
+# the result to PROFILE_DIR; set PROFILE_SIGNAL_ENABLED=false to leave it alone
+PROFILE_SIGNAL_ENABLED = os.getenv('PROFILE_SIGNAL_ENABLED', 'true').lower() == 'true'
+PROFILE_SIGNAL_SECONDS = float(os.getenv('PROFILE_SIGNAL_SECONDS', '30'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', '.')
+
+# Leaf frames of threads that are waiting rather than running Python code
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread in this process at a fixed interval.
+
+    Runs on its own thread, so it sees the event loop and the blocking pool
+    alike without instrumenting either. Samples are aggregated into the
+    collapsed-stack format read by flamegraph.pl, speedscope and similar
+    tools: one "thread;outer frame;...;leaf frame count" line per stack.
+
+    Threads that are only waiting (an idle event loop, pool workers waiting
+    for work) are skipped unless include_idle is set. With focus, only
+    samples passing through one of those code objects are kept, and they are
+    trimmed to start at the outermost such frame.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000, focus: Optional[Iterable] = None,
+                 include_idle: bool = False):
+        self.interval = interval
+        self.focus: Optional[Set] = {getattr(f, "__code__", f) for f in focus} if focus else None
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self._labels: Dict = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: _thread_group(thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(names.get(ident, "thread"), frame)
+            self.samples += 1
+
+    def _sample(self, thread_name: str, frame):
+        if not self.include_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+            return
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        if self.focus is not None:
+            start = next((i for i, code in enumerate(codes) if code in self.focus), None)
+            if start is None:
+                return
+            codes = codes[start:]
+        self.stacks[(thread_name,) + tuple(self._label(code) for code in codes)] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+            label = self._labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+        return label
+
+    def collapsed(self) -> str:
+        """The samples as collapsed stacks, most frequent first"""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _thread_group(name: str) -> str:
+    """Pool threads share a frame: "blocking_3" -> "blocking" """
+    return re.sub(r"[_-]?\d+$", "", name or "thread") or "thread"
+
+
+# One profile at a time per process
+_running = threading.Lock()
+
+
+def _acquire():
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+
+
+def profile_for(seconds: float, **options) -> SamplingProfiler:
+    """Profile for `seconds`, blocking the calling thread; raises ProfilerBusy if a profile is running"""
+    _acquire()
+    profiler = SamplingProfiler(**options).start()
+    try:
+        time.sleep(min(seconds, PROFILE_MAX_SECONDS))
+    finally:
+        profiler.stop()
+        _running.release()
+    return profiler
+
+
+async def profile_async(seconds: float, **options) -> SamplingProfiler:
+    """profile_for for async callers: the event loop keeps serving requests while it samples"""
+    _acquire()
+    profiler = SamplingProfiler(**options).start()
+    try:
+        await asyncio.sleep(min(seconds, PROFILE_MAX_SECONDS))
+    finally:
+        # Also stops sampling when the client goes away mid-profile
+        profiler.stop()
+        _running.release()
+    return profiler
+
+
+def _profile_to_file(seconds: float):
+    try:
+        profiler = profile_for(seconds)
+        path = os.path.join(PROFILE_DIR, f"profile-{os.getpid()}-{int(time.time())}.collapsed")
+        with open(path, "w") as f:
+            f.write(profiler.collapsed())
+        print(f"Wrote {profiler.samples} samples over {profiler.elapsed:.1f} s to {path}")
+    except Exception as e:
+        print(f"Error profiling worker: {str(e)}")
+
+
+def install_signal_handler(seconds: float = PROFILE_SIGNAL_SECONDS, signum: int = getattr(signal, "SIGUSR2", 0)) -> bool:
+    """Profile the whole process for `seconds` whenever it receives signum (SIGUSR2 by default)"""
+    if not signum:
+        return False
+
+    def handler(received, frame):
+        # Signal handlers run on the main thread between bytecodes; do the work elsewhere
+        threading.Thread(target=_profile_to_file, args=(seconds,), name="profile-signal", daemon=True).start()
+
+    try:
+        signal.signal(signum, handler)
+    except ValueError as e:
+        # Only the main thread may install handlers, e.g. not under an embedded server
+        print(f"Error installing the profiling signal handler: {str(e)}")
+        return False
+    return True
@@ -0,0 +1,37 @@
+import re
+from typing import Any, Dict, Optional
+
+# Anything between single braces is a placeholder, as with the str.replace it supersedes
+PLACEHOLDER = re.compile(r"\{([^{}]+)\}")
+
+
+class ResponseTemplate:
+    """A response template parsed once into literal segments and placeholder slots.
+
+    segments alternates literal text and placeholder names, starting and
+    ending with literal text, so rendering fills the odd positions and
+    joins once. fields holds every placeholder name, which is what a
+    caller needs to fetch before rendering.
+    """
+
+    __slots__ = ("source", "segments", "fields")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.segments = tuple(PLACEHOLDER.split(source))
+        self.fields = frozenset(self.segments[1::2])
+
+    def render(self, user_data: Optional[Dict[str, Any]] = None, entities: Optional[Dict[str, Any]] = None) -> str:
+        """Fill each placeholder from user_data, else from a non-empty entity, else leave it as written"""
+        if not self.fields:
+            return self.source
+        parts = list(self.segments)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            if user_data and name in user_data:
+                parts[i] = str(user_data[name])
+            elif entities and entities.get(name):
+                parts[i] = str(entities[name])
+            else:
+                parts[i] = "{" + name + "}"
+        return "".join(parts)
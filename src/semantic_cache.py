@@ -0,0 +1,117 @@
+import os
+import threading
+import zlib
+from typing import Dict, Optional
+import numpy as np
+from intent_cache import normalize_message
+
+# A false hit silently answers with another message's intent, so this is off by
+# default. 0.85 keeps rewordings that differ in filler words or word order
+# ("my phone has no signal" / "no signal on my phone": 0.91) and rejects
+# near-misses such as "upgrade my plan" / "downgrade my plan" (0.69).
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85'))
+SEMANTIC_CACHE_MAX_SIZE = int(os.getenv('SEMANTIC_CACHE_MAX_SIZE', '2000'))
+SEMANTIC_CACHE_DIM = int(os.getenv('SEMANTIC_CACHE_DIM', '1024'))
+
+# Filler words that make unrelated requests look alike ("i want to ...").
+# Negations are deliberately kept.
+STOP_WORDS = {
+    "i", "me", "my", "the", "a", "an", "to", "is", "am", "are", "was", "be", "it",
+    "please", "want", "would", "like", "can", "you", "your", "do", "does", "did",
+    "have", "has", "of", "for", "on", "in", "at", "again", "what", "whats", "s",
+    "how", "much", "there", "this", "that"
+}
+
+# Words that flip a message's meaning. normalize_message turns "isn't" into
+# "isn t", hence the lone "t".
+NEGATIONS = {"not", "no", "never", "t", "cannot", "cant", "dont", "doesnt", "isnt", "wont", "nothing", "without"}
+
+
+class HashedNgramVectorizer:
+    """Maps text to a unit vector of hashed character n-gram and word counts.
+
+    Uses crc32 rather than hash() so vectors are stable across processes.
+    """
+
+    def __init__(self, dim: int = SEMANTIC_CACHE_DIM, ngram_sizes=(3, 4)):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    def features(self, text: str):
+        words = [word for word in normalize_message(text).split() if word not in STOP_WORDS]
+        padded = f" {' '.join(words)} "
+        for n in self.ngram_sizes:
+            for i in range(len(padded) - n + 1):
+                yield padded[i:i + n]
+        for word in words:
+            yield f"w:{word}"
+
+    @staticmethod
+    def negated(text: str) -> bool:
+        return any(word in NEGATIONS for word in normalize_message(text).split())
+
+    def transform(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode('utf-8'))
+            # The top bit picks the sign so colliding features tend to cancel out
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticIntentCache:
+    """Reuses the intent of the most similar previously classified message.
+
+    Keeps a fixed-size ring of message vectors and answers lookups with one
+    matrix-vector product, so rewordings such as "my phone has no signal" and
+    "no signal on my phone" share a single OpenAI classification. Only
+    messages with the same polarity are compared, so "my internet is down"
+    never reuses the intent of "my internet is not down".
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_size: int = SEMANTIC_CACHE_MAX_SIZE, dim: int = SEMANTIC_CACHE_DIM):
+        self.threshold = threshold
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self.vectors = np.zeros((max_size, dim), dtype=np.float32)
+        self.negated = np.zeros(max_size, dtype=bool)
+        self.analyses = [None] * max_size
+        self.size = 0
+        self._next = 0
+        self._stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def lookup(self, message: str) -> Optional[dict]:
+        """Return the intent of the nearest stored message if it is similar enough"""
+        vector = self.vectorizer.transform(message)
+        negated = self.vectorizer.negated(message)
+        with self._lock:
+            if self.size:
+                similarities = np.where(self.negated[:self.size] == negated, self.vectors[:self.size] @ vector, -1.0)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._stats["hits"] += 1
+                    analysis = self.analyses[best]
+                    # Entities belong to the original wording, so only the intent carries over
+                    return {"intent": analysis["intent"], "entities": {}, "urgency": analysis.get("urgency", "low")}
+            self._stats["misses"] += 1
+        return None
+
+    def add(self, message: str, analysis: dict):
+        """Remember a classified message, overwriting the oldest once full"""
+        if not analysis.get("intent"):
+            return
+        vector = self.vectorizer.transform(message)
+        negated = self.vectorizer.negated(message)
+        with self._lock:
+            self.vectors[self._next] = vector
+            self.negated[self._next] = negated
+            self.analyses[self._next] = {"intent": analysis["intent"], "urgency": analysis.get("urgency", "low")}
+            self._next = (self._next + 1) % len(self.analyses)
+            self.size = min(self.size + 1, len(self.analyses))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": self.size}
@@ -0,0 +1,99 @@
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+from cache import LRUCache
+
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', '1800'))
+SESSION_MAX_USERS = int(os.getenv('SESSION_MAX_USERS', '10000'))
+
+
+@dataclass
+class SessionState:
+    """Menu navigation state for a single user"""
+    last_intent: Optional[str] = None
+    menu_history: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {"last_intent": self.last_intent, "menu_history": list(self.menu_history)}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "SessionState":
+        if not data:
+            return cls()
+        return cls(last_intent=data.get("last_intent"), menu_history=list(data.get("menu_history") or []))
+
+
+class SessionStore(ABC):
+    """Interface for per-user conversation state backends"""
+
+    @abstractmethod
+    def get(self, session_id: str) -> SessionState:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, state: SessionState):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """In-process LRU session store with TTL eviction"""
+
+    def __init__(self, max_size: int = SESSION_MAX_USERS, ttl: int = SESSION_TTL_SECONDS):
+        self._cache = LRUCache(max_size=max_size, ttl=ttl)
+
+    def get(self, session_id: str) -> SessionState:
+        state = self._cache.get(session_id)
+        # Hand out a copy so concurrent requests never share one mutable object
+        return SessionState.from_dict(state.to_dict()) if state else SessionState()
+
+    def save(self, session_id: str, state: SessionState):
+        self._cache.set(session_id, state)
+
+    def delete(self, session_id: str):
+        self._cache.delete(session_id)
+
+
+class MongoSessionStore(SessionStore):
+    """Session store shared by every worker through a MongoDB collection"""
+
+    def __init__(self, db):
+        # MongoDB removes idle sessions on its own once updated_at is older than
+        # SESSION_TTL_SECONDS; the TTL index is created by migration 5
+        self.sessions = db.db['session']
+
+    def get(self, session_id: str) -> SessionState:
+        try:
+            doc = self.sessions.find_one({"_id": session_id}, {"_id": 0, "last_intent": 1, "menu_history": 1})
+            return SessionState.from_dict(doc)
+        except Exception as e:
+            print(f"Error loading session: {str(e)}")
+            return SessionState()
+
+    def save(self, session_id: str, state: SessionState):
+        try:
+            self.sessions.update_one(
+                {"_id": session_id},
+                {"$set": {**state.to_dict(), "updated_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Error saving session: {str(e)}")
+
+    def delete(self, session_id: str):
+        self.sessions.delete_one({"_id": session_id})
+
+
+def create_session_store(db=None) -> SessionStore:
+    """Build the session store selected by the SESSION_BACKEND environment variable"""
+    backend = os.getenv('SESSION_BACKEND', 'memory').lower()
+    if backend == 'mongo':
+        if db is None:
+            raise ValueError("SESSION_BACKEND=mongo requires a DatabaseHandler")
+        return MongoSessionStore(db)
+    return InMemorySessionStore()
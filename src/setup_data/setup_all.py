@@ -2,6 +2,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database import DatabaseHandler
+from migrations import seed_default_responses
 
 def setup_all():
     """Setup all collections in the correct order"""
@@ -210,6 +211,9 @@ def setup_all():
         ]
         result = db.response.insert_many(responses)
         print(f"Successfully inserted {len(result.inserted_ids)} responses")
+
+        # Put back the default responses cleared above that this data does not replace
+        seed_default_responses(db)
         
         # Verify data
         print("\nVerifying inserted data...")
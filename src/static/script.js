@@ -133,7 +133,7 @@ async function sendMessage() {
     if (!message) return;
 
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -142,13 +142,23 @@ async function sendMessage() {
             body: JSON.stringify({ message })
         });
 
-        const data = await response.json();
-        
         if (response.ok) {
             appendMessage('user', message);
-            appendMessage('bot', data.response);
             messageInput.value = '';
+            // Render the reply as it streams in: a status line first, then the text
+            const botMessage = appendMessage('bot', '');
+            let text = '';
+            await readEventStream(response, (event, data) => {
+                if (event === 'status' && !text) {
+                    botMessage.textContent = data.text;
+                } else if (event === 'delta') {
+                    text += data.text;
+                    botMessage.textContent = text;
+                }
+                chatMessages.scrollTop = chatMessages.scrollHeight;
+            });
         } else {
+            const data = await response.json();
             alert(data.detail || 'Failed to send message');
         }
     } catch (error) {
@@ -157,9 +167,32 @@ async function sendMessage() {
     }
 }
 
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            onEvent(event, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 async function loadChatHistory() {
     try {
-        const response = await fetch('/chat-history', {
+        const response = await fetch('/chat/history', {
             headers: {
                 'Authorization': `Bearer ${accessToken}`
             }
@@ -169,8 +202,10 @@ async function loadChatHistory() {
         
         if (response.ok) {
             chatMessages.innerHTML = '';
-            data.history.forEach(msg => {
-                appendMessage(msg.role, msg.content);
+            // Pages come newest first; show them in conversation order
+            data.history.slice().reverse().forEach(chat => {
+                appendMessage('user', chat.user_message);
+                appendMessage('bot', chat.bot_response);
             });
         }
     } catch (error) {
@@ -184,6 +219,7 @@ function appendMessage(role, content) {
     messageDiv.textContent = content;
     chatMessages.appendChild(messageDiv);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageDiv;
 }
 
 // Profile Functions
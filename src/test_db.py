@@ -1,4 +1,4 @@
-from src.database import DatabaseHandler
+from database import DatabaseHandler
 import os
 from dotenv import load_dotenv
 
@@ -12,16 +12,15 @@ def test_database_connection():
         test_message = "Test message"
         test_response = "Test response"
         
-        result = db.save_conversation(test_user_id, test_message, test_response)
+        db.save_conversation(test_user_id, test_message, test_response)
         print("Successfully saved conversation!")
-        print(f"Inserted ID: {result.inserted_id}")
         
         # Test retrieving conversation history
-        history = db.get_conversation_history(test_user_id)
+        history = db.get_chat_history(test_user_id)
         print("\nRetrieved conversation history:")
         for conv in history:
-            print(f"Message: {conv['message']}")
-            print(f"Response: {conv['response']}")
+            print(f"Message: {conv['user_message']}")
+            print(f"Response: {conv['bot_response']}")
             print(f"Timestamp: {conv['timestamp']}")
             print("---")
         
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from chatbot import TelecomChatbot
+from intent_cache import IntentCache
+from intent_batcher import IntentBatcher
+
+
+def completion(content: str):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def chatbot_replying(*contents: str) -> TelecomChatbot:
+    """A chatbot whose OpenAI clients answer with contents in turn, counting the calls"""
+    chatbot = TelecomChatbot(db=SimpleNamespace())
+    replies = iter(contents)
+    chatbot.calls = 0
+
+    def create(**kwargs):
+        chatbot.calls += 1
+        return completion(next(replies))
+
+    async def create_async(**kwargs):
+        return create(**kwargs)
+
+    chatbot.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    chatbot.async_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create_async)))
+    return chatbot
+
+
+def test_malformed_reply_is_not_cached():
+    chatbot = chatbot_replying('{"category": "billing"}', '{"intent": "billing", "entities": {}}')
+    assert chatbot._analyze_with_openai("why is my bill so high") == chatbot._fallback_intent()
+    assert chatbot.intent_cache.stats()["stores"] == 0
+    assert chatbot.llm_breaker.stats()["successes_total"] == 0
+    # The next identical message asks OpenAI again instead of reusing the bad reply
+    assert chatbot._analyze_with_openai("why is my bill so high")["intent"] == "billing"
+    assert chatbot.calls == 2
+
+
+def test_malformed_async_reply_is_not_cached():
+    chatbot = chatbot_replying('["billing"]')
+    assert asyncio.run(chatbot._analyze_with_openai_async("my bill")) == chatbot._fallback_intent()
+    assert chatbot.intent_cache.get("my bill") is None
+
+
+def test_batch_retries_only_entries_without_intent():
+    batch = {"results": [{"intent": "billing"}, {}, {"intent": 3}]}
+    chatbot = chatbot_replying(json.dumps(batch), '{"intent": "network_issues"}', '{"urgency": "low"}')
+    chatbot.intent_batcher = IntentBatcher(chatbot._complete_intents_batch_async, max_size=3,
+                                           breaker=chatbot.llm_breaker)
+
+    async def classify():
+        return await asyncio.gather(*(chatbot._analyze_with_openai_async(m) for m in ("bill", "no signal", "hello there")))
+
+    results = asyncio.run(classify())
+    assert [r["intent"] for r in results] == ["billing", "network_issues", "main_menu"]
+    # One batch request, then one request for each entry that had no intent
+    assert chatbot.calls == 3
+    assert chatbot.intent_cache.get("hello there") is None
+    assert chatbot.intent_cache.stats()["stores"] == 2
+
+
+def test_cache_refuses_analysis_without_intent():
+    cache = IntentCache("fingerprint", persist=False)
+    cache.set("my bill", {"category": "billing"})
+    assert cache.get("my bill") is None
+    assert cache.stats()["stores"] == 0
+
+
+if __name__ == "__main__":
+    test_malformed_reply_is_not_cached()
+    test_malformed_async_reply_is_not_cached()
+    test_batch_retries_only_entries_without_intent()
+    test_cache_refuses_analysis_without_intent()
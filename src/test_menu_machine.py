@@ -0,0 +1,41 @@
+import pytest
+from chatbot_rules import MENU_STRUCTURE
+from menu_machine import MenuMachine, MenuStructureError, ROOT
+
+
+def test_shipped_menu_compiles():
+    menu = MenuMachine(MENU_STRUCTURE)
+    assert ROOT in menu
+    assert all(state in menu for state in MENU_STRUCTURE)
+
+
+def test_unreachable_menu_is_rejected():
+    structure = {
+        ROOT: {"title": "Main Menu", "options": {1: {"text": "Billing", "intent": "billing"}}},
+        "orphan": {"title": "Orphan", "options": {1: {"text": "Back", "intent": ROOT}}},
+    }
+    with pytest.raises(MenuStructureError, match="orphan"):
+        MenuMachine(structure)
+
+
+def test_dangling_option_is_reported():
+    structure = {
+        ROOT: {"title": "Main Menu", "options": {1: {"text": "Billing", "intent": "billing"},
+                                                 2: {"text": "Roaming", "intent": "roaming"}}},
+        "billing": {"title": "Billing", "options": {1: {"text": "Pay", "intent": "payment"}}},
+    }
+    menu = MenuMachine(structure, known_intents={"payment"})
+    assert menu.dangling == ["Menu 'main_menu' option 2 leads to 'roaming', which has no menu or response"]
+    assert MenuMachine(structure).dangling == []
+
+
+def test_option_without_intent_is_rejected():
+    with pytest.raises(MenuStructureError):
+        MenuMachine({ROOT: {"options": {1: {"text": "Billing"}}}})
+
+
+if __name__ == "__main__":
+    test_shipped_menu_compiles()
+    test_unreachable_menu_is_rejected()
+    test_dangling_option_is_reported()
+    test_option_without_intent_is_rejected()
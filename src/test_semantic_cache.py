@@ -0,0 +1,31 @@
+from semantic_cache import SemanticIntentCache
+
+ANALYSIS = {"intent": "network_issues", "entities": {}, "urgency": "high"}
+
+
+def cache_with(message: str) -> SemanticIntentCache:
+    cache = SemanticIntentCache(max_size=8)
+    cache.add(message, ANALYSIS)
+    return cache
+
+
+def test_rewording_reuses_intent():
+    cache = cache_with("my phone has no signal")
+    assert cache.lookup("no signal on my phone")["intent"] == "network_issues"
+
+
+def test_negation_does_not_reuse_intent():
+    assert cache_with("my internet is down").lookup("my internet is not down") is None
+    assert cache_with("i can pay my bill").lookup("i can't pay my bill") is None
+
+
+def test_different_wording_below_threshold():
+    assert cache_with("net not working").lookup("internet isn't working") is None
+    assert cache_with("upgrade my plan").lookup("downgrade my plan") is None
+
+
+if __name__ == "__main__":
+    test_rewording_reuses_intent()
+    test_negation_does_not_reuse_intent()
+    test_different_wording_below_threshold()
+    print("Semantic cache tests passed")
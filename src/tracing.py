@@ -0,0 +1,329 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Request-scoped span trees for debugging tail latency. Off by default.
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'false').lower() == 'true'
+# Fraction of requests traced, decided when the request starts
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.01'))
+# When > 0, every request records its spans and those slower than this are
+# exported even if they were not sampled. Costs a span tree per request.
+TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '0'))
+# "file" appends one OTLP/JSON document per line; "otlp" posts them to a collector
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'file').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+OTLP_ENDPOINT = os.getenv('OTLP_ENDPOINT', 'http://127.0.0.1:4318/v1/traces')
+TRACE_QUEUE_MAX = int(os.getenv('TRACE_QUEUE_MAX', '1000'))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'telecom-chatbot')
+
+_random = random.Random()
+
+
+class Trace:
+    """The spans of one request, exported together when its root span ends"""
+
+    __slots__ = ("trace_id", "sampled", "spans")
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.trace = trace
+        self.span_id = f"{_random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+        self.end_ns: Optional[int] = None
+        self.start_ns = time.time_ns()
+        trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(traces: List[Trace], service_name: str = TRACE_SERVICE_NAME) -> dict:
+    """An OTLP/JSON ExportTraceServiceRequest for finished traces"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+        "scopeSpans": [{
+            "scope": {"name": "tracing"},
+            "spans": [span.to_otlp() for trace in traces for span in trace.spans],
+        }],
+    }]}
+
+
+class FileSpanExporter:
+    """Appends each batch as one OTLP/JSON line"""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, traces: List[Trace]):
+        line = json.dumps(to_otlp(traces), separators=(",", ":"))
+        with self._lock, open(self.path, "a") as f:
+            f.write(line + "\n")
+
+
+class OTLPHttpSpanExporter:
+    """Posts each batch to an OTLP/HTTP collector as JSON"""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, timeout: float = 5):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, traces: List[Trace]):
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(to_otlp(traces), separators=(",", ":")).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class BatchSpanProcessor:
+    """Hands finished traces to an exporter from a background thread.
+
+    Requests only enqueue; when TRACE_QUEUE_MAX traces are waiting, new
+    ones are dropped and counted rather than slowing requests down.
+    """
+
+    def __init__(self, exporter, max_queue: int = TRACE_QUEUE_MAX, batch_size: int = 64,
+                 flush_interval: float = 1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, trace: Trace):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: List[Trace]):
+        try:
+            self.exporter.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Error exporting traces: {str(e)}")
+
+    def shutdown(self, timeout: float = 5):
+        """Export what is queued and stop the thread"""
+        if self._thread is not None:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "exported": self.exported, "dropped": self.dropped,
+                "failed": self.failed}
+
+
+# The innermost open span of the current request
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    __slots__ = ("span", "token", "tracer")
+
+    def __init__(self, span: Span, tracer: Optional["Tracer"] = None):
+        self.span = span
+        self.tracer = tracer
+
+    def __enter__(self) -> Span:
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end(exc)
+        _current_span.reset(self.token)
+        if self.tracer is not None:
+            self.tracer._finish(self.span)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Starts request traces, samples them and passes kept ones to the processor"""
+
+    def __init__(self, processor: Optional[BatchSpanProcessor] = None, sample_rate: float = TRACE_SAMPLE_RATE,
+                 slow_ms: float = TRACE_SLOW_MS, enabled: bool = TRACING_ENABLED):
+        self.processor = processor
+        self.sample_rate = sample_rate
+        self.slow_ns = int(slow_ms * 1e6)
+        self.enabled = enabled and processor is not None
+
+    def start_trace(self, name: str, attributes: Optional[Dict[str, Any]] = None, traceparent: Optional[str] = None):
+        """Root span of a request; a no-op unless the request is sampled or slow traces are kept.
+
+        A W3C traceparent header joins the caller's trace and follows its
+        sampling decision.
+        """
+        if not self.enabled:
+            return NO_SPAN
+        trace_id, parent_id, sampled = _parse_traceparent(traceparent)
+        if trace_id is None:
+            trace_id = f"{_random.getrandbits(128):032x}"
+            sampled = _random.random() < self.sample_rate
+        if not sampled and not self.slow_ns:
+            return NO_SPAN
+        return _SpanScope(Span(Trace(trace_id, sampled), name, parent_id, attributes), self)
+
+    def _finish(self, root: Span):
+        trace = root.trace
+        if trace.sampled or root.end_ns - root.start_ns >= self.slow_ns:
+            self.processor.submit(trace)
+
+    def shutdown(self):
+        if self.processor is not None:
+            self.processor.shutdown()
+
+    def stats(self) -> Optional[Dict[str, int]]:
+        return self.processor.stats() if self.enabled else None
+
+
+def _parse_traceparent(header: Optional[str]):
+    """(trace id, parent span id, sampled) from a traceparent header, or Nones if absent or invalid"""
+    parts = header.strip().split("-") if header else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == "0" * 32:
+        return None, None, False
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None, False
+    return parts[1], parts[2], bool(flags & 1)
+
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Child of the current span for a with block; a no-op outside a recorded trace"""
+    parent = _current_span.get()
+    if parent is None:
+        return NO_SPAN
+    return _SpanScope(Span(parent.trace, name, parent.span_id, attributes))
+
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Optional[Span]:
+    """Child of the current span that the caller ends, for callbacks such as pymongo's command events"""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def set_attribute(key: str, value: Any):
+    """Set an attribute on the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def create_tracer() -> Tracer:
+    if not TRACING_ENABLED:
+        return Tracer(enabled=False)
+    if TRACE_EXPORTER == "otlp":
+        exporter = OTLPHttpSpanExporter()
+    else:
+        exporter = FileSpanExporter()
+    return Tracer(BatchSpanProcessor(exporter))
+
+
+tracer = create_tracer()